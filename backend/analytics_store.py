@@ -0,0 +1,183 @@
+"""
+Persisted chat-history classifications and per-user analytics summaries
+for /api/weekly_topics
+"""
+import json
+import hashlib
+from typing import Optional, Dict, List, Iterable, Tuple
+
+from database import safe_db_operation
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a message's text; an edited message is classified again"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def known_keys(keys: Iterable[Tuple[str, str]]) -> set:
+    """
+    Return the (msg_id, content_hash) pairs that are already classified.
+
+    Args:
+        keys: Candidate (msg_id, content_hash) pairs
+    """
+    keys = set(keys)
+    ids = sorted({msg_id for msg_id, _ in keys})
+    stored = set()
+    with safe_db_operation("look up classified messages", metric="analytics_known_keys") as conn:
+        cursor = conn.cursor()
+        # stay well under SQLite's bound-parameter limit
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            cursor.execute(
+                f"SELECT msg_id, content_hash FROM message_classifications "
+                f"WHERE msg_id IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            stored.update((row["msg_id"], row["content_hash"]) for row in cursor.fetchall())
+    return keys & stored
+
+
+def save_classifications(rows: List[Dict]) -> None:
+    """
+    Insert or replace classified messages, dropping older versions of an
+    edited message.
+
+    Args:
+        rows: Dicts with msg_id, content_hash, user_id, chatbot_id, convo_id,
+              msg_timestamp, msg_text, topic, bloom_level and label_source
+              ("llm" or "embedding")
+    """
+    if not rows:
+        return
+    with safe_db_operation("save message classifications", metric="analytics_save") as conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO message_classifications
+                (msg_id, content_hash, user_id, chatbot_id, convo_id, msg_timestamp,
+                 msg_text, topic, bloom_level, label_source)
+            VALUES (:msg_id, :content_hash, :user_id, :chatbot_id, :convo_id, :msg_timestamp,
+                    :msg_text, :topic, :bloom_level, :label_source)
+        """, rows)
+        conn.executemany(
+            "DELETE FROM message_classifications WHERE msg_id = :msg_id AND content_hash != :content_hash",
+            rows
+        )
+
+
+def _window(start: Optional[str], end: Optional[str]) -> Tuple[str, List[str]]:
+    # optional msg_timestamp range (ISO strings, end exclusive) as an SQL condition and its params
+    sql, params = "", []
+    if start:
+        sql += " AND msg_timestamp >= ?"
+        params.append(start)
+    if end:
+        sql += " AND msg_timestamp < ?"
+        params.append(end)
+    return sql, params
+
+
+def user_classifications(user_id: int, chatbot_id: int, start: Optional[str] = None,
+                         end: Optional[str] = None) -> List[Dict]:
+    """Classified messages of a user, oldest first, optionally only those sent in [start, end)"""
+    window, params = _window(start, end)
+    with safe_db_operation("fetch user classifications", metric="analytics_user_rows") as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT msg_id, convo_id, msg_timestamp, msg_text, topic, bloom_level
+            FROM message_classifications
+            WHERE user_id = ? AND chatbot_id = ?{window}
+            ORDER BY msg_timestamp, msg_id
+        """, (user_id, chatbot_id, *params))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def label_counts(user_id: int, chatbot_id: int, start: Optional[str] = None,
+                 end: Optional[str] = None) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Count a user's classified messages per label, optionally only those sent
+    in [start, end).
+
+    Returns:
+        Tuple of (bloom level -> count, topic -> count)
+    """
+    window, params = _window(start, end)
+    with safe_db_operation("count user classifications", metric="analytics_counts") as conn:
+        cursor = conn.cursor()
+        counts = []
+        for column in ("bloom_level", "topic"):
+            cursor.execute(f"""
+                SELECT {column} AS label, COUNT(*) AS n FROM message_classifications
+                WHERE user_id = ? AND chatbot_id = ?{window} GROUP BY {column}
+            """, (user_id, chatbot_id, *params))
+            counts.append({row["label"]: row["n"] for row in cursor.fetchall()})
+    return counts[0], counts[1]
+
+
+def training_examples(limit: int = 5000) -> List[Dict]:
+    """Most recent LLM-labelled messages of all users, for training the local classifier"""
+    with safe_db_operation("fetch classification examples", metric="analytics_examples") as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT msg_text, topic, bloom_level FROM message_classifications
+            WHERE msg_text IS NOT NULL AND msg_text != '' AND label_source = 'llm'
+            ORDER BY created_at DESC LIMIT ?
+        """, (limit,))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_user_analytics(user_id: int, chatbot_id: int) -> Optional[Dict]:
+    """
+    Get a user's watermark and pre-aggregated summary (one primary-key lookup).
+
+    Returns:
+        Dict with watermark, summary and updated_at, or None if the user has
+        never been processed
+    """
+    with safe_db_operation("fetch user analytics", metric="analytics_summary") as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT watermark, summary, updated_at
+            FROM user_analytics WHERE user_id = ? AND chatbot_id = ?
+        """, (user_id, chatbot_id))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return {
+        "watermark": row["watermark"],
+        "summary": json.loads(row["summary"]) if row["summary"] else None,
+        "updated_at": row["updated_at"],
+    }
+
+
+def save_user_analytics(user_id: int, chatbot_id: int, watermark: Optional[str], summary: Dict) -> None:
+    """Store a user's new watermark and summary"""
+    with safe_db_operation("save user analytics", metric="analytics_summary_save") as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO user_analytics
+                (user_id, chatbot_id, watermark, summary, updated_at)
+            VALUES (?, ?, ?, ?, datetime('now'))
+        """, (user_id, chatbot_id, watermark, json.dumps(summary)))
+
+
+def touch_user_analytics(user_id: int, chatbot_id: int, watermark: Optional[str]) -> None:
+    """Record a refresh that found nothing new: store the watermark and bump updated_at, keeping the summary"""
+    with safe_db_operation("touch user analytics", metric="analytics_summary_save") as conn:
+        conn.execute("""
+            UPDATE user_analytics SET watermark = ?, updated_at = datetime('now')
+            WHERE user_id = ? AND chatbot_id = ?
+        """, (watermark, user_id, chatbot_id))
+
+
+def active_users(active_days: int = 14, skip_fresh_s: float = 12 * 3600) -> List[Tuple[int, int]]:
+    """
+    (user_id, chatbot_id) pairs with chat activity in the last active_days whose
+    summary is older than skip_fresh_s, for the nightly refresh.
+    """
+    with safe_db_operation("list active analytics users", metric="analytics_active_users") as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT user_id, chatbot_id FROM user_analytics
+            WHERE watermark >= datetime('now', ?) AND updated_at < datetime('now', ?)
+            ORDER BY user_id, chatbot_id
+        """, (f"-{int(active_days)} days", f"-{int(skip_fresh_s)} seconds"))
+        return [(row["user_id"], row["chatbot_id"]) for row in cursor.fetchall()]
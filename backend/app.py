@@ -1,17 +1,28 @@
 # app.py
-import os, argparse
+import os, sys, csv, json, time, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ragcore.ingest import ingest_dir
+from ragcore.chunkstore import ChunkStore
 from ragcore.embed import VectorIndex
 from ragcore.retrieve import HybridRetriever
 from ragcore.rerank import Reranker
-from ragcore.orchestrate import detect_intent, rewrite_query, compress_context
+from ragcore.orchestrate import detect_intent, rewrite_query, compress_context, pack_context
 from ragcore.generate import call_llm
 from ragcore.verify import self_check
 
-def bootstrap_index(data_dir="data/raw"):
-    chunks = ingest_dir(data_dir)
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1200"))  # prompt context budget
+
+def bootstrap_index(data_dir="data/raw", index_path=None):
+    # index_path: load a saved faiss index (built from the same data_dir), or save one there
+    chunks = ChunkStore.from_chunks(ingest_dir(data_dir))
     vec = VectorIndex("intfloat/e5-base")         # swap to text-embedding-3-large if you want
-    vec.build(chunks)
+    if index_path and os.path.exists(index_path):
+        vec.store = chunks
+        vec.load_index(index_path)
+    else:
+        vec.build(chunks)
+        if index_path:
+            vec.save_index(index_path)
     retriever = HybridRetriever(chunks, vec)
     reranker = Reranker("BAAI/bge-reranker-base")
     return retriever, reranker
@@ -21,18 +32,148 @@ def answer(query: str, retriever, reranker, top_k=8):
     q2 = rewrite_query(query, intent)
     candidates = retriever.retrieve(q2, top_k=40)
     ranked = reranker.rerank(q2, candidates, top_k=top_k)
-    ctx = compress_context(ranked, max_chars=3500)
+    ctx = compress_context(ranked, max_chars=None)
+    ctx = pack_context(query, ctx, max_tokens=CONTEXT_TOKENS)
     ans = call_llm(query, ctx, model=os.getenv("RAG_LLM", "llama3.2:3b"))
     issues = self_check(ans, query)
     return ans, issues
 
+def read_queries(path: str) -> list[dict]:
+    """Queries from JSONL ({"query": ..., "id": ...} per line) or CSV (query[,id] columns)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    items = []
+    for n, row in enumerate(rows, 1):
+        q = (row.get("query") or "").strip()
+        if q:
+            items.append({"id": str(row.get("id") or n), "query": q})
+    return items
+
+def answered_ids(out_path: str) -> set:
+    # ids already written without an error; a partially written last line is ignored
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in row:
+                done.add(str(row.get("id")))
+    return done
+
+def compact_output(out_path: str) -> int:
+    """
+    Rewrite out_path with exactly one row per id, in first-seen order: the latest
+    answer, or the latest error if the id never succeeded. A resumed run appends
+    the retried ids again, so this runs before and after each batch run; a
+    partially written last line is dropped. Returns the number of rows removed.
+    """
+    if not os.path.exists(out_path):
+        return 0
+    final, n_rows = {}, 0
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            n_rows += 1
+            key = str(row.get("id"))
+            if key not in final or "error" in final[key] or "error" not in row:
+                final[key] = row
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for row in final.values():
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(tmp, out_path)
+    return n_rows - len(final)
+
+def answer_batch(items: list[dict], retriever, reranker, out, top_k=8, batch_size=32, workers=4):
+    """
+    Answer items in batches of batch_size: one encoder call for retrieval and one
+    cross-encoder call for reranking per batch, then up to `workers` concurrent
+    LLM calls. Writes one JSONL row per query to out as soon as it is answered;
+    retrieve_ms / rerank_ms are the query's share of its batch.
+    """
+    model = os.getenv("RAG_LLM", "llama3.2:3b")
+
+    def generate(item, ctx, timings):
+        t = time.perf_counter()
+        ans = call_llm(item["query"], ctx, model=model)
+        issues = self_check(ans, item["query"])
+        timings["generate_ms"] = round((time.perf_counter() - t) * 1000, 1)
+        return ans, issues
+
+    n_done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            t = time.perf_counter()
+            rewritten = [rewrite_query(it["query"], detect_intent(it["query"])) for it in batch]
+            candidates = retriever.retrieve_many(rewritten, top_k=40)
+            retrieve_ms = (time.perf_counter() - t) * 1000 / len(batch)
+            t = time.perf_counter()
+            ranked = reranker.rerank_many([(q, c, top_k) for q, c in zip(rewritten, candidates)])
+            rerank_ms = (time.perf_counter() - t) * 1000 / len(batch)
+
+            futures = {}
+            for it, hits in zip(batch, ranked):
+                t = time.perf_counter()
+                ctx = pack_context(it["query"], compress_context(hits, max_chars=None), max_tokens=CONTEXT_TOKENS)
+                timings = {"retrieve_ms": round(retrieve_ms, 1), "rerank_ms": round(rerank_ms, 1),
+                           "pack_ms": round((time.perf_counter() - t) * 1000, 1)}
+                futures[pool.submit(generate, it, ctx, timings)] = (it, timings)
+            for fut in as_completed(futures):
+                it, timings = futures[fut]
+                row = {"id": it["id"], "query": it["query"]}
+                try:
+                    row["answer"], row["checks"] = fut.result()
+                except Exception as e:
+                    row["error"] = f"{type(e).__name__}: {e}"
+                row["timings"] = {**timings, "total_ms": round(sum(timings.values()), 1)}
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+                n_done += 1
+            print(f"[batch] {start + len(batch)}/{len(items)} queries", file=sys.stderr)
+    return n_done
+
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--query", required=True)
+    parser = argparse.ArgumentParser(
+        epilog="batch mode: python app.py --input queries.jsonl --output answers.jsonl --index app.index "
+               "(re-run the same command to resume; rows with an error are retried and replaced)")
+    parser.add_argument("--query", help="answer a single question")
+    parser.add_argument("--input", help="JSONL/CSV file of queries to answer in batch mode")
+    parser.add_argument("--output", default="answers.jsonl", help="batch mode: JSONL results (appended; resumes)")
+    parser.add_argument("--batch_size", type=int, default=32, help="batch mode: queries per encode/rerank batch")
+    parser.add_argument("--workers", type=int, default=4, help="batch mode: concurrent LLM calls")
+    parser.add_argument("--index", help="faiss index file to load, or to save after building")
     parser.add_argument("--data_dir", default="data/raw")
     args = parser.parse_args()
+    if not args.query and not args.input:
+        parser.error("one of --query or --input is required")
+
+    if args.input:
+        compact_output(args.output)
+        items = read_queries(args.input)
+        done = answered_ids(args.output)
+        todo = [it for it in items if it["id"] not in done]
+        print(f"[batch] {len(items)} queries, {len(items) - len(todo)} already answered in {args.output}",
+              file=sys.stderr)
+        if todo:
+            retriever, reranker = bootstrap_index(args.data_dir, args.index)
+            with open(args.output, "a", encoding="utf-8") as out:
+                answer_batch(todo, retriever, reranker, out, batch_size=args.batch_size, workers=args.workers)
+            # retried ids now have their earlier error row too; keep one final row each
+            compact_output(args.output)
+        sys.exit(0)
 
-    retriever, reranker = bootstrap_index(args.data_dir)
+    retriever, reranker = bootstrap_index(args.data_dir, args.index)
     ans, issues = answer(args.query, retriever, reranker)
     print("\n=== ANSWER ===\n", ans)
     if issues:
@@ -1,27 +1,76 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 
 # Import RAG pipeline functions
 from ragcore.ingest import ingest_dir
+from ragcore.chunkstore import ChunkStore
 from ragcore.embed import VectorIndex
 from ragcore.retrieve import HybridRetriever
 from ragcore.rerank import Reranker
-from ragcore.orchestrate import detect_intent, rewrite_query, compress_context
-from ragcore.generate import call_llm
+from ragcore.orchestrate import detect_intent, rewrite_query, compress_context, pack_context
+from ragcore.generate import call_llm, passages_answer, _inflight, generation_pool, classification_pool, nala_backend, SingleFlight
+from ragcore.backends import NoBackendAvailable
+from ragcore.deadline import Deadline
+from ragcore.admission import AdmissionController, Rejected
 from ragcore.verify import self_check
+from ragcore.cache import llm_cache, request_key
+from ragcore.inference import InferencePool
+from ragcore.classify import CentroidClassifier
 
 import os
 import requests
 import json
 from collections import defaultdict
+from datetime import datetime, timedelta
 import time
+import threading
+import gc
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 
 # Import challenges API
 from challenges_api import challenges_bp
+import metrics
+import analytics_store
+from jobs import JobScheduler, get_job
 
 BASE_URL = os.getenv("BASE_URL", "https://nala.ntu.edu.sg") 
 API_KEY = os.getenv("API_KEY", "pk_LearnUS_176q45") 
 API_URL = "http://127.0.0.1:5000/api/ask"
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1200"))  # prompt context budget
+# Micro-batching of concurrent /api/ask encode + rerank work (RAG_BATCH_MAX=1 disables)
+BATCH_WAIT_MS = float(os.getenv("RAG_BATCH_WAIT_MS", "5"))
+BATCH_MAX = int(os.getenv("RAG_BATCH_MAX", "16"))
+EMBED_MODEL = "intfloat/e5-small-v2"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# >0 runs encoder/cross-encoder inference in that many worker processes instead of request threads
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+# End-to-end /api/ask budget; stages degrade (skip rerank, shrink context, skip generation) when it runs low
+DEADLINE_S = float(os.getenv("RAG_DEADLINE_S", "30"))
+MIN_GENERATE_S = 2.0  # below this, return the passages instead of calling the LLM
+TOPIC_LIST_TTL_S = float(os.getenv("TOPIC_LIST_TTL_S", "600"))  # NALA topic list reuse per chatbot
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "10"))  # user messages per joint classification prompt
+CLASSIFY_CONCURRENCY = int(os.getenv("CLASSIFY_CONCURRENCY", "4"))  # classification LLM calls in flight
+BLOOM_TERMS = ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]
+# Local nearest-centroid labels are used when both topic and Bloom confidence reach this (>1 disables)
+CLASSIFY_FAST_CONFIDENCE = float(os.getenv("CLASSIFY_FAST_CONFIDENCE", "0.7"))
+CLASSIFY_FAST_RETRAIN_S = 3600  # picks up new LLM labels from message_classifications
+CHALLENGES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "challenges.csv")
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "200"))  # rows per /api/chathistory request
+DEFAULT_ANALYTICS_USER = 20  # /api/weekly_topics without ?user_id= (the previously hardcoded user)
+# Background analytics jobs (per process): worker threads, summary age that triggers a
+# background refresh, and the local hour the nightly refresh of active users runs
+ANALYTICS_JOB_WORKERS = int(os.getenv("ANALYTICS_JOB_WORKERS", "1"))
+ANALYTICS_STALE_S = float(os.getenv("ANALYTICS_STALE_S", str(24 * 3600)))
+ANALYTICS_NIGHTLY_HOUR = int(os.getenv("ANALYTICS_NIGHTLY_HOUR", "2"))
+ANALYTICS_ACTIVE_DAYS = int(os.getenv("ANALYTICS_ACTIVE_DAYS", "14"))
+# Admission control for /api/ask (per process): concurrent pipelines, queued requests,
+# longest queue wait, and queued requests allowed per user_id
+ASK_MAX_CONCURRENT = int(os.getenv("RAG_MAX_CONCURRENT", "4"))
+ASK_QUEUE_MAX = int(os.getenv("RAG_QUEUE_MAX", "32"))
+ASK_QUEUE_WAIT_S = float(os.getenv("RAG_QUEUE_WAIT_S", "10"))
+ASK_QUEUE_PER_USER = int(os.getenv("RAG_QUEUE_PER_USER", "4"))
 
 app = Flask(__name__)
 CORS(app)
@@ -77,29 +126,167 @@ def handle_exception(error):
         'status': 500
     }), 500
 
+metrics.REGISTRY.callback(
+    "llm_cache_events_total", "On-disk LLM cache hits/misses/evictions",
+    lambda: {k: v for k, v in llm_cache.stats().items() if k != "bytes"} if llm_cache else {},
+    kind="counter", labelnames=["event"])
+metrics.REGISTRY.callback(
+    "llm_cache_bytes", "Approximate size of the on-disk LLM cache",
+    lambda: llm_cache.stats()["bytes"] if llm_cache else 0)
+metrics.REGISTRY.callback(
+    "inference_pool_pending", "Inference calls waiting on or running in the worker pool",
+    lambda: inference_pool.pending if inference_pool else 0)
+def _backend_stat(field):
+    return lambda: {name: st[field] or 0
+                    for name, st in generation_pool.stats()["backends"].items()}
+
+def _pool_stat(field):
+    return lambda: {"generation": generation_pool.stats()[field],
+                    "classification": classification_pool.stats()[field]}
+
+metrics.REGISTRY.callback("llm_backend_requests_total", "Calls per LLM backend",
+                          _backend_stat("requests"), kind="counter", labelnames=["backend"])
+metrics.REGISTRY.callback("llm_backend_failures_total", "Failed calls per LLM backend",
+                          _backend_stat("failures"), kind="counter", labelnames=["backend"])
+for _q in ("p50", "p95", "p99"):
+    metrics.REGISTRY.callback(f"llm_backend_latency_{_q}_seconds", f"Recent {_q} latency per LLM backend",
+                              _backend_stat(f"{_q}_s"), labelnames=["backend"])
+metrics.REGISTRY.callback(
+    "llm_backend_circuit_open", "1 while a backend's circuit breaker is open (0.5 half-open)",
+    lambda: {name: {"closed": 0, "half_open": 0.5, "open": 1}[st["state"]]
+             for name, st in generation_pool.stats()["backends"].items()},
+    labelnames=["backend"])
+metrics.REGISTRY.callback("llm_pool_hedges_total", "Hedged second requests sent",
+                          _pool_stat("hedges"), kind="counter", labelnames=["pool"])
+metrics.REGISTRY.callback("llm_pool_hedge_wins_total", "Hedged requests that answered first",
+                          _pool_stat("hedge_wins"), kind="counter", labelnames=["pool"])
+metrics.REGISTRY.callback("llm_pool_fallbacks_total", "Calls retried on the next backend after a failure",
+                          _pool_stat("fallbacks"), kind="counter", labelnames=["pool"])
+metrics.REGISTRY.callback(
+    "llm_coalesced_total", "call_llm requests served by an identical in-flight request",
+    lambda: _inflight.coalesced, kind="counter")
+
+def _chunk_store_stat(field):
+    def read():
+        store = retriever.chunks if retriever is not None else None
+        return store.memory_report()[field] if isinstance(store, ChunkStore) else 0
+    return read
+
+metrics.REGISTRY.callback("rag_chunk_store_bytes", "Bytes held by the live chunk store (text, offsets, metadata)",
+                          _chunk_store_stat("total_bytes"))
+metrics.REGISTRY.callback("rag_chunk_store_bytes_per_chunk", "Chunk store bytes per chunk",
+                          _chunk_store_stat("bytes_per_chunk"))
+
+RAG_BATCH_SIZE = metrics.REGISTRY.histogram(
+    "rag_batch_size", "Requests per micro-batch", ["batcher"], buckets=(1, 2, 4, 8, 16, 32, 64))
+RAG_BATCH_WAIT = metrics.REGISTRY.histogram(
+    "rag_batch_wait_seconds", "Time the oldest request waited for its micro-batch", ["batcher"])
+
+def enable_batching(retriever, reranker):
+    if BATCH_MAX <= 1:
+        return
+    def observer(name):
+        def on_batch(size, wait_s):
+            RAG_BATCH_SIZE.observe(size, batcher=name)
+            RAG_BATCH_WAIT.observe(wait_s, batcher=name)
+        return on_batch
+    if retriever.batcher is None:
+        retriever.enable_batching(BATCH_WAIT_MS, BATCH_MAX, on_batch=observer("encode"))
+    if reranker.batcher is None:
+        reranker.enable_batching(BATCH_WAIT_MS, BATCH_MAX, on_batch=observer("rerank"))
+
 # Bootstrap index ONCE at startup
 retriever, reranker = None, None
-def llm(text, system=None, timeout_s=30):
+inference_pool = None
+
+def _load_models(encoder=None):
+    """Encoder and cross-encoder, local or proxied to the inference pool."""
+    global inference_pool
+    if INFERENCE_WORKERS > 0:
+        if inference_pool is None:
+            inference_pool = InferencePool(EMBED_MODEL, RERANK_MODEL,
+                                           workers=INFERENCE_WORKERS, threads_per_worker=INFERENCE_THREADS)
+        return encoder or inference_pool.encoder(), inference_pool.cross_encoder()
+    return encoder, None
+
+# RAG readiness, advanced by run_bootstrap():
+# pending -> ingesting -> embedding -> loading_reranker -> warming_up -> ready (or failed)
+RETRY_AFTER_S = 10
+rag_status = {"state": "pending", "error": None, "started_at": None, "ready_at": None}
+_bootstrap_lock = threading.Lock()
+
+def _set_rag_state(state, error=None):
+    rag_status["state"] = state
+    rag_status["error"] = error
+    print(f"[RAG] {state}" + (f": {error}" if error else ""))
+
+def rag_ready():
+    return rag_status["state"] == "ready" and retriever is not None and reranker is not None
+
+# Hot reload: each (retriever, reranker) pair is a generation; requests pin the
+# generation they started on, and a replaced generation is released once drained
+_index_cond = threading.Condition()
+_index_generation = 0
+_index_users = defaultdict(int)  # generation -> requests in flight
+_reload_lock = threading.Lock()
+reload_status = {"state": "idle", "generation": 0, "error": None, "started_at": None, "finished_at": None}
+
+@contextmanager
+def use_index():
+    """Pin the live retriever/reranker for the duration of one request."""
+    with _index_cond:
+        gen, r, rr = _index_generation, retriever, reranker
+        _index_users[gen] += 1
+    try:
+        yield r, rr
+    finally:
+        with _index_cond:
+            _index_users[gen] -= 1
+            if _index_users[gen] <= 0:
+                del _index_users[gen]
+                _index_cond.notify_all()
+
+def swap_index(new_retriever, new_reranker, drain_timeout_s=120):
+    """
+    Atomically make new_retriever/new_reranker live, then wait for requests
+    still on the previous generation to finish so its memory can be freed.
+    """
+    global retriever, reranker, _index_generation
+    with _index_cond:
+        old_gen = _index_generation
+        old_retriever, old_reranker = retriever, reranker
+        retriever, reranker = new_retriever, new_reranker
+        _index_generation += 1
+        reload_status["generation"] = _index_generation
+        drained = _index_cond.wait_for(lambda: _index_users.get(old_gen, 0) == 0, timeout=drain_timeout_s)
+    if not drained:
+        print(f"[RAG] generation {old_gen} still has requests in flight after {drain_timeout_s}s; releasing anyway")
+    # stop the old micro-batch threads, which otherwise keep the old index alive
+    if old_retriever is not None and old_retriever is not new_retriever:
+        old_retriever.close()
+    if old_reranker is not None and old_reranker is not new_reranker:
+        old_reranker.close()
+    del old_retriever, old_reranker
+    gc.collect()
+    return drained
+
+def llm(text, system=None, timeout_s=30, use_cache=True):
     url = f"{BASE_URL}/api/llm"
-    headers = {
-        "X-API-Key": API_KEY,
-        "Content-Type": "application/json",
-    }
-    payload = {"text": text}
-    if system:
-        payload["system"] = system
-    r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=timeout_s)
-    if not r.ok:
-        try:
-            print("Error body:", r.json())
-        except Exception:
-            print("Error text:", r.text)
-            r.raise_for_status()
-    data = r.json()
+    # Classification prompts repeat across analytics runs; serve them from disk
+    key = request_key(url, "nala", system, text, {})
+    if use_cache and llm_cache is not None:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+    # NALA first, with circuit breaking, hedging and fallback to local Ollama
+    data = classification_pool.call(system, text, timeout=timeout_s)
+    # the key names NALA, so answers from a fallback or hedged backend aren't stored under it
+    if use_cache and llm_cache is not None and data.get("backend") == nala_backend.name:
+        llm_cache.set(key, data)
     return data
     
 def classify_bloom_taxonomy(msg_text):
-    bloom_terms = ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]
+    bloom_terms = BLOOM_TERMS
     system_prompt = (
         "You are a Bloom's taxonomy classifier. Given the following question, choose ONE term from this list that best fits the cognitive level required:\n"
         f"{bloom_terms}\n"
@@ -117,31 +304,37 @@ def classify_bloom_taxonomy(msg_text):
         bloom_level = "Unknown"
     return bloom_level
     
-def print_chat_history(data):
-    # Group by conversation
-    convos = defaultdict(list)
-    for msg in data:
-        title = msg.get('convo_title', f"Conversation {msg.get('convo_id', '?')}")
-        convos[title].append(msg)
-
-    for title, messages in convos.items():
-        print(f"=== Conversation: {title} ===")
-        for m in messages:
-            ts = m.get('msg_timestamp', '')
-            sender = m.get('msg_sender', '')
-            text = m.get('msg_text', '')
-            # If text is a JSON string, parse it
-            try:
-                import json
-                text_obj = json.loads(text)
-                if isinstance(text_obj, list) and text_obj and 'text' in text_obj[0]:
-                    text = text_obj[0]['text']
-            except Exception:
-                pass
-            prefix = '' if sender == 'user' else '  '
-            print(f"[{ts}] {sender}:\\n{prefix}{text}\\n")
-            
-def get_topic_list(chatbot_id=3, timeout=15): 
+# chatbot_id -> (fetched_at, topic list response); concurrent misses share one fetch
+_topic_list_cache = {}
+_topic_list_flight = SingleFlight()
+TOPIC_LIST_REQUESTS = metrics.REGISTRY.counter(
+    "topic_list_requests_total", "get_topic_list calls by cache result", ["result"])
+
+def get_topic_list(chatbot_id=3, timeout=15, max_age_s=None):
+    """
+    NALA topic list for chatbot_id, reused for TOPIC_LIST_TTL_S (or max_age_s)
+    seconds. A stale copy is served if a refresh fails.
+    """
+    max_age_s = TOPIC_LIST_TTL_S if max_age_s is None else max_age_s
+    cached = _topic_list_cache.get(chatbot_id)
+    if cached is not None and time.time() - cached[0] < max_age_s:
+        TOPIC_LIST_REQUESTS.inc(result="hit")
+        return cached[1]
+    TOPIC_LIST_REQUESTS.inc(result="miss")
+    try:
+        return _topic_list_flight.do(chatbot_id, lambda: _refresh_topic_list(chatbot_id, timeout), timeout=timeout)
+    except Exception as e:
+        if cached is None:
+            raise
+        print(f"Topic list refresh failed ({e}); using copy from {time.time() - cached[0]:.0f}s ago")
+        return cached[1]
+
+def _refresh_topic_list(chatbot_id, timeout):
+    data = _fetch_topic_list(chatbot_id, timeout)
+    _topic_list_cache[chatbot_id] = (time.time(), data)
+    return data
+
+def _fetch_topic_list(chatbot_id=3, timeout=15): 
     url = f"{BASE_URL}/api/topiclist" 
     headers = {"X-API-Key": API_KEY} 
     params = {"chatbot_id": chatbot_id} 
@@ -159,11 +352,10 @@ def get_topic_list(chatbot_id=3, timeout=15):
 
     return data
 
-def get_chat_history(chatbot_id: int, **filters): 
+def _fetch_chat_history_page(chatbot_id, params):
     url = f"{BASE_URL}/api/chathistory" 
     headers = {"X-API-Key": API_KEY} 
-    params = {"chatbot_id": chatbot_id, **filters} 
-    bloom_terms = ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]
+    params = {"chatbot_id": chatbot_id, **params} 
     r = requests.get(url, headers=headers, params=params, timeout=20) 
     try: 
         r.raise_for_status() 
@@ -172,53 +364,79 @@ def get_chat_history(chatbot_id: int, **filters):
             print("Error body:", r.json()) 
         except Exception: 
             print("Error text:", r.text)
-            raise 
-    data = r.json() 
-    print(f"Returned {len(data)} rows")
-
-    conversation_ids = []
-    for msg in data:
-        convo_id = msg.get('conversation_id') or msg.get('convo_id')
-        if convo_id is not None:
-            conversation_ids.append(convo_id)
-    print("All conversation IDs:", conversation_ids)
-    
-    # Group messages by conversation title
-    convos = defaultdict(list)
-    for msg in data:
-        title = msg.get('convo_title', f"Conversation {msg.get('convo_id', '?')}")
-        convos[title].append(msg)
-
-    results = []
-    for title, messages in convos.items():
-        print(f"Conversation Title: {title}")
-        for msg in messages:
-            msg_text = msg.get("msg_text", "")
-            try:
-                text_obj = json.loads(msg_text)
-                if isinstance(text_obj, list) and text_obj and 'text' in text_obj[0]:
-                    msg_text = text_obj[0]['text']
-            except Exception:
-                pass
-            topic, llm_reply = determine_topic(msg_text)
-            bloom_level = classify_bloom_taxonomy(msg_text)
-            print(f"Detected topic: {topic}")
-            msg_sender = msg.get("msg_sender", "")
-            if msg_sender == "user":
-               results.append({"msg_text": msg_text, "topic": topic, "bloom_level": bloom_level})
-        print("-" * 40)
-
-    bloom_counts = defaultdict(int)
-    total = len(results)
-    
-    for item in results:
-        bloom_counts[item["bloom_level"]] += 1
-        
+        raise 
+    return r.json() 
+
+def iter_chat_history(chatbot_id: int, start=None, end=None, page_size=None, **filters):
+    """
+    Yield chat history rows page by page (limit/offset), so only one page is
+    held at a time. start/end (ISO date or datetime strings, end exclusive) are
+    applied to msg_timestamp here; their dates are also sent as start_date /
+    end_date so the server can skip older pages. A server that ignores paging
+    returns everything in the first page.
+    """
+    page_size = page_size or CHAT_HISTORY_PAGE_SIZE
+    params = dict(filters)
+    if start:
+        params["start_date"] = start[:10]
+    if end and len(end) == 10:  # a datetime end would lose part of its last day
+        params["end_date"] = end
+    offset, total, first_key = 0, 0, None
+    while True:
+        page = _fetch_chat_history_page(chatbot_id, {**params, "limit": page_size, "offset": offset})
+        if not page:
+            break
+        key = _message_key(page[0], page[0].get("msg_text", ""))
+        if key == first_key:  # offset ignored: the same page came back
+            break
+        first_key = key
+        for msg in page:
+            ts = msg.get("msg_timestamp") or ""
+            if ts and ((start and ts < start) or (end and ts >= end)):
+                continue
+            total += 1
+            yield msg
+        if len(page) != page_size:  # short page: the end, or paging unsupported
+            break
+        offset += page_size
+    print(f"Returned {total} rows")
+
+def week_window(weeks_ago=0, now=None):
+    """(start, end) ISO dates of the 7-day window ending today (weeks_ago=0) or earlier weeks."""
+    end = (now or datetime.now()).date() + timedelta(days=1) - timedelta(weeks=weeks_ago)
+    return (end - timedelta(days=7)).isoformat(), end.isoformat()
+
+def _chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def message_text(msg):
+    # msg_text may be a JSON list of content parts; use the first part's text
+    msg_text = msg.get("msg_text", "")
+    try:
+        text_obj = json.loads(msg_text)
+        if isinstance(text_obj, list) and text_obj and 'text' in text_obj[0]:
+            msg_text = text_obj[0]['text']
+    except Exception:
+        pass
+    return msg_text
+
+def bloom_summary(bloom_counts):
+    """Bloom level percentages and the strongest/weakest level message from per-level counts."""
+    bloom_terms = BLOOM_TERMS
+    total = sum(bloom_counts.values())
+
     print("Bloom's Taxonomy Level Percentages:")
     bloom_percentages = {}
     
     for level in bloom_terms:
-        count = bloom_counts[level]
+        count = bloom_counts.get(level, 0)
         percent = (count / total) * 100 if total > 0 else 0
         bloom_percentages[level] = percent
         print(f"{level}: {percent:.1f}% ({count}/{total})")
@@ -244,11 +462,8 @@ def get_chat_history(chatbot_id: int, **filters):
             "Consider practicing more higher-order thinking tasks."
         )
     print("Custom Bloom Analysis:", custom_msg)
-    
-    llm_reply = determine_topic_aptitude(results)
-    print(llm_reply)
-    return results,custom_msg, conversation_ids
-   
+    return bloom_percentages, custom_msg
+
 def determine_topic_aptitude(results):
     # Count occurrences for each topic
     topic_counts = defaultdict(int)
@@ -272,8 +487,12 @@ def determine_topic_aptitude(results):
         "Return your answer as:\nStrongest: <topic>\nWeakest: <topic>\n"
     )
 
-    # Send to LLM
-    data = llm(summary, system=system_prompt)
+    # Send to LLM; a failed call leaves strongest/weakest unset rather than losing the summary
+    try:
+        data = llm(summary, system=system_prompt)
+    except Exception as e:
+        print(f"Topic aptitude analysis failed: {type(e).__name__}: {e}")
+        return None
     llm_reply = data.get("text", "")
     
     strongest = weakest = None
@@ -285,9 +504,9 @@ def determine_topic_aptitude(results):
             
     return strongest,weakest
     
-def determine_topic(msg_content):
+def determine_topic(msg_content, chatbot_id=3):
     #print(f"Classifying topic for: {msg_content}")
-    topics = get_topic_list(3)
+    topics = get_topic_list(chatbot_id)
     start = time.time()
     topic_list = topics.get("topic_list", ["Unknown"])
     system_prompt = (
@@ -312,48 +531,565 @@ def determine_topic(msg_content):
     print(f"Elapsed time: {elapsed:.2f} seconds")
     return topic, llm_reply
 
-# Global cache for analytics
-weekly_topics_cache = None
-
-def process_weekly_topics():
-    chatbot_id = 3
-    user_id = 20
-    convo_id = 84
-    topic_data = get_topic_list(chatbot_id)
-    topic_list = topic_data.get("topic_list", ["Unknown"])
-    results,bloom_message, conversation_ids = get_chat_history(chatbot_id, user_id=user_id, convo_id=convo_id)
-    strongest, weakest = determine_topic_aptitude(results)
-    return {
-        "strongest": strongest.title(),
-        "weakest": weakest.title(),
-        "topic_list": topic_list,
+def _match_term(reply, terms):
+    # first term (in list order) that appears in the reply, case-insensitively
+    reply_clean = (reply or "").strip().lower()
+    for term in terms:
+        if term.lower() in reply_clean:
+            return term
+    return None
+
+def _classify_batch(texts, topic_list):
+    """
+    Topic and Bloom level for several messages from one LLM call.
+    Returns {index: (topic, bloom_level)} for the messages it could parse.
+    """
+    numbered = "\n".join(f"{i}. {' '.join(t.split())[:1000]}" for i, t in enumerate(texts, 1))
+    system_prompt = (
+        "You are a classifier for student messages. For EACH numbered message, choose ONE topic "
+        f"from this list:\n{topic_list}\n"
+        f"and ONE Bloom's taxonomy level from this list:\n{BLOOM_TERMS}\n"
+        'Return ONLY a JSON array with one object per message, e.g. '
+        '[{"id": 1, "topic": "<topic>", "bloom": "<level>"}], using the names exactly as listed.'
+    )
+    data = llm(numbered, system=system_prompt)
+    reply = data.get("text", "")
+    try:
+        items = json.loads(reply[reply.index("["):reply.rindex("]") + 1])
+    except ValueError:
+        print(f"Could not parse batch classification reply: {reply[:200]}")
+        return {}
+    labels = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("id")) - 1
+        except (TypeError, ValueError):
+            continue
+        topic = _match_term(str(item.get("topic", "")), topic_list)
+        bloom_level = _match_term(str(item.get("bloom", "")), BLOOM_TERMS)
+        if 0 <= idx < len(texts) and topic and bloom_level:
+            labels[idx] = (topic, bloom_level)
+    return labels
+
+CLASSIFIED_MESSAGES = metrics.REGISTRY.counter(
+    "classified_messages_total", "Chat messages labelled, by path (embedding, llm, failed)", ["path"])
+metrics.REGISTRY.callback(
+    "classify_llm_rate", "Fraction of labelled messages that needed an LLM call",
+    lambda: CLASSIFIED_MESSAGES.value(path="llm") / max(1, CLASSIFIED_MESSAGES.value(path="llm")
+                                                        + CLASSIFIED_MESSAGES.value(path="embedding")))
+
+_fast_classifiers = {"encoder": None, "trained_at": 0.0, "examples": [], "bloom": None, "models": {}}
+_fast_classifiers_lock = threading.Lock()
+
+def _fast_training_data():
+    # labelled challenge questions plus past LLM labels (newest first, "Unknown" left out)
+    examples = []
+    try:
+        import csv
+        with open(CHALLENGES_CSV, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                examples.append((row.get("question", ""), row.get("category", ""), row.get("bloom_level", "")))
+    except OSError as e:
+        print(f"Fast classifier: cannot read {CHALLENGES_CSV}: {e}")
+    try:
+        examples += [(r["msg_text"], r["topic"], r["bloom_level"]) for r in analytics_store.training_examples()]
+    except Exception as e:
+        print(f"Fast classifier: no stored LLM labels ({e})")
+    return [(text, topic, bloom) for text, topic, bloom in examples if text and text.strip()]
+
+def fast_classifiers(topic_list):
+    """
+    (bloom, topic) CentroidClassifiers on the RAG encoder for this topic list,
+    retrained every CLASSIFY_FAST_RETRAIN_S. None until the index is loaded, when
+    disabled, or while any Bloom level or listed topic has too few labelled
+    examples: the model could only pick among the classes it has seen.
+    """
+    live = retriever
+    if live is None or CLASSIFY_FAST_CONFIDENCE > 1:
+        return None
+    encoder = live.vec.model
+    with _fast_classifiers_lock:
+        state = _fast_classifiers
+        if state["encoder"] is not encoder or time.time() - state["trained_at"] >= CLASSIFY_FAST_RETRAIN_S:
+            examples = _fast_training_data()
+            start = time.time()
+            bloom = CentroidClassifier(encoder).fit(
+                [t for t, _, b in examples if b in BLOOM_TERMS], [b for _, _, b in examples if b in BLOOM_TERMS],
+                classes=BLOOM_TERMS)
+            state.update(encoder=encoder, trained_at=time.time(), examples=examples, bloom=bloom, models={})
+            print(f"Fast classifier trained on {len(examples)} examples in {time.time() - start:.2f}s "
+                  f"(bloom levels lacking examples: {bloom.missing or 'none'})")
+        key = tuple(topic_list)
+        if key not in state["models"]:
+            # only examples labelled with one of this chatbot's topics (e.g. challenges.csv
+            # categories that NALA also lists) train the topic model
+            canonical = {t.lower(): t for t in topic_list}
+            pairs = [(t, canonical[tp.lower()]) for t, tp, _ in state["examples"] if tp and tp.lower() in canonical]
+            topic = CentroidClassifier(encoder).fit([t for t, _ in pairs], [tp for _, tp in pairs],
+                                                    classes=list(canonical.values()))
+            models = (state["bloom"], topic) if state["bloom"].ready and topic.ready else None
+            state["models"][key] = models
+            print(f"Fast classifier for {len(topic_list)} topics: "
+                  f"{'enabled' if models else 'disabled'} (topics lacking examples: {topic.missing or 'none'})")
+        return state["models"][key]
+
+def _classify_fast(texts, topic_list):
+    """{index: (topic, bloom_level)} for messages the local classifier is confident about."""
+    models = fast_classifiers(topic_list) if texts else None
+    if models is None:
+        return {}
+    bloom_clf, topic_clf = models
+    try:
+        vecs = bloom_clf.embed(texts)
+        blooms, topics = bloom_clf.predict_embedded(vecs), topic_clf.predict_embedded(vecs)
+    except Exception as e:
+        print(f"Fast classification failed, using the LLM: {e}")
+        return {}
+    labels = {}
+    for i, ((bloom_level, bloom_conf), (topic, topic_conf)) in enumerate(zip(blooms, topics)):
+        # the predicted topic must be one of this chatbot's topics
+        topic = next((t for t in topic_list if t.lower() == topic.lower()), None)
+        if topic and min(bloom_conf, topic_conf) >= CLASSIFY_FAST_CONFIDENCE:
+            labels[i] = (topic, bloom_level)
+    return labels
+
+def _classify_one(text, chatbot_id):
+    topic, _ = determine_topic(text, chatbot_id)
+    return topic, classify_bloom_taxonomy(text)
+
+def classify_messages(texts, chatbot_id=3, batch_size=None, concurrency=None):
+    """
+    (topic, bloom_level, source) for each message text, in order, where source
+    is "embedding" or "llm", or None for a message whose classification
+    failed. The local embedding classifier
+    labels the messages it is confident about; the rest are sent batch_size
+    at a time in one joint LLM prompt, and any message missing from a batch
+    reply is classified on its own with determine_topic and
+    classify_bloom_taxonomy. At most `concurrency` LLM calls run at once.
+    """
+    topic_list = get_topic_list(chatbot_id).get("topic_list", ["Unknown"])
+    labels = [None] * len(texts)
+    for i, label in _classify_fast(texts, topic_list).items():
+        labels[i] = (*label, "embedding")
+    rest = [i for i, label in enumerate(labels) if label is None]
+    for i, label in zip(rest, _classify_llm([texts[i] for i in rest], chatbot_id, topic_list,
+                                            batch_size, concurrency)):
+        labels[i] = (*label, "llm") if label is not None else None
+    n_fast = len(texts) - len(rest)
+    n_failed = sum(1 for i in rest if labels[i] is None)
+    CLASSIFIED_MESSAGES.inc(n_fast, path="embedding")
+    CLASSIFIED_MESSAGES.inc(len(rest) - n_failed, path="llm")
+    CLASSIFIED_MESSAGES.inc(n_failed, path="failed")
+    if texts:
+        print(f"Classified {len(texts)} messages: {n_fast} locally, {len(rest)} via LLM "
+              f"(LLM rate {len(rest) / len(texts):.0%}), {n_failed} failed")
+    return labels
+
+def _classify_llm(texts, chatbot_id, topic_list, batch_size=None, concurrency=None):
+    batch_size = batch_size or CLASSIFY_BATCH_SIZE
+    concurrency = concurrency or CLASSIFY_CONCURRENCY
+    labels = [None] * len(texts)
+    if not texts:
+        return labels
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="classify") as pool:
+        singles = {}
+        if batch_size > 1:
+            batches = {pool.submit(_classify_batch, texts[start:start + batch_size], topic_list): start
+                       for start in range(0, len(texts), batch_size)}
+            for fut in as_completed(batches):
+                start = batches[fut]
+                try:
+                    parsed = fut.result()
+                except Exception as e:
+                    print(f"Batch classification of messages {start + 1}-{start + batch_size} failed: {e}")
+                    parsed = {}
+                for i in range(start, min(start + batch_size, len(texts))):
+                    if i - start in parsed:
+                        labels[i] = parsed[i - start]
+                    else:
+                        singles[pool.submit(_classify_one, texts[i], chatbot_id)] = i
+        else:
+            singles = {pool.submit(_classify_one, text, chatbot_id): i for i, text in enumerate(texts)}
+        for fut in as_completed(singles):
+            try:
+                labels[singles[fut]] = fut.result()
+            except Exception as e:
+                print(f"Classification of message {singles[fut] + 1} failed: {e}")
+    return labels
+
+def _message_key(msg, text):
+    # (message id, content hash); histories without ids fall back to conversation + timestamp
+    msg_id = msg.get("msg_id") or msg.get("id") or f"{msg.get('convo_id', '?')}:{msg.get('msg_timestamp', '')}"
+    return str(msg_id), analytics_store.content_hash(text)
+
+def refresh_user_analytics(user_id, chatbot_id=3, full=False):
+    """
+    Classify a user's new chat messages and rebuild their /api/weekly_topics summary.
+    Only user messages at or after the stored watermark whose (message id, content
+    hash) isn't already in message_classifications are sent to the LLM; full=True
+    ignores the watermark so edits to older messages are picked up too. The history
+    is deduplicated, classified and saved a page at a time, so memory stays bounded
+    by CHAT_HISTORY_PAGE_SIZE however long it is.
+    """
+    state = analytics_store.get_user_analytics(user_id, chatbot_id)
+    previous = state["watermark"] if state else None
+    watermark = previous if not full else None
+
+    def user_messages():
+        # ISO timestamps compare correctly as strings, so the watermark doubles as the start date
+        for msg in iter_chat_history(chatbot_id, start=watermark, user_id=user_id):
+            if msg.get("msg_sender", "") == "user":
+                text = message_text(msg)
+                yield msg, text, _message_key(msg, text)
+
+    n_seen = n_saved = 0
+    first_failed = latest = None
+    for page in _chunked(user_messages(), CHAT_HISTORY_PAGE_SIZE):
+        known = analytics_store.known_keys(key for _, _, key in page)
+        new = [c for c in page if c[2] not in known]
+        n_seen += len(page)
+        if not new:
+            continue
+        labels = classify_messages([text for _, text, _ in new], chatbot_id)
+        rows = []
+        for (msg, text, (msg_id, digest)), label in zip(new, labels):
+            ts = msg.get("msg_timestamp") or ""
+            if label is None:
+                first_failed = min(ts, first_failed) if first_failed is not None else ts
+                continue
+            rows.append({"msg_id": msg_id, "content_hash": digest, "user_id": user_id, "chatbot_id": chatbot_id,
+                         "convo_id": msg.get("convo_id") or msg.get("conversation_id"), "msg_timestamp": ts,
+                         "msg_text": text, "topic": label[0], "bloom_level": label[1], "label_source": label[2]})
+            if ts:
+                latest = max(ts, latest) if latest else ts
+        analytics_store.save_classifications(rows)
+        n_saved += len(rows)
+    print(f"User {user_id}: classified {n_saved} new messages ({n_seen} since the watermark)")
+
+    # advance past what was classified, but not past a failure so it's retried next time
+    new_watermark = first_failed if first_failed is not None else max(filter(None, (latest, previous)), default=None)
+    if state and state["summary"] is not None and not n_saved:
+        # still a completed check: updated_at moves on, so the summary isn't stale for another ANALYTICS_STALE_S
+        analytics_store.touch_user_analytics(user_id, chatbot_id, new_watermark)
+        return state["summary"]
+
+    summary = build_user_summary(user_id, chatbot_id)
+    analytics_store.save_user_analytics(user_id, chatbot_id, new_watermark, summary)
+    return summary
+
+def _stored_counts(user_id, chatbot_id=3, start=None, end=None):
+    # everything in the summary that comes from message_classifications alone (no NALA calls);
+    # start/end (ISO dates, end exclusive) restrict it to messages sent in that window
+    bloom_counts, topic_counts = analytics_store.label_counts(user_id, chatbot_id, start, end)
+    _, bloom_message = bloom_summary(bloom_counts)
+    total = sum(bloom_counts.values())
+    stored = analytics_store.user_classifications(user_id, chatbot_id, start, end)
+    return stored, {
         "bloom_message": bloom_message,
-        "conversation_ids": conversation_ids
+        "bloom_percentages": {level: (bloom_counts.get(level, 0) / total) * 100 if total else 0
+                              for level in BLOOM_TERMS},
+        "topic_counts": topic_counts,
+        "conversation_ids": list(dict.fromkeys(r["convo_id"] for r in stored if r["convo_id"] is not None)),
+        "classified_messages": total,
+    }
+
+def build_user_summary(user_id, chatbot_id=3):
+    """Aggregate a user's stored classifications into the /api/weekly_topics response."""
+    stored, counts = _stored_counts(user_id, chatbot_id)
+    aptitude = determine_topic_aptitude(stored) if stored else None
+    strongest, weakest = aptitude or (None, None)
+    return {
+        "user_id": user_id,
+        "strongest": strongest.title() if strongest else None,
+        "weakest": weakest.title() if weakest else None,
+        "topic_list": get_topic_list(chatbot_id).get("topic_list", ["Unknown"]),
+        **counts,
+        "updated_at": time.time(),
     }
+
+def window_summary(summary, user_id, chatbot_id=3, start=None, end=None):
+    """
+    The /api/weekly_topics response for messages sent in [start, end), from the
+    stored classifications only, so it is cheap enough to build per request.
+    strongest/weakest come from the refresh's LLM analysis of the whole history
+    and are left null; topic_list and updated_at are the stored summary's.
+    """
+    _, counts = _stored_counts(user_id, chatbot_id, start, end)
+    return {**summary, "strongest": None, "weakest": None, **counts, "window": {"start": start, "end": end}}
+
+def process_weekly_topics(user_id=DEFAULT_ANALYTICS_USER, chatbot_id=3):
+    return refresh_user_analytics(user_id, chatbot_id)
+
+ANALYTICS_JOBS_ENQUEUED = metrics.REGISTRY.counter(
+    "analytics_jobs_enqueued_total", "Analytics refresh requests, by whether a new job was queued",
+    ["kind", "result"])
+
+def enqueue_analytics_refresh(user_id, chatbot_id=3, full=False, kind="weekly_topics"):
+    """Queue a background refresh; returns (job, created), reusing an already queued or running one."""
+    job, created = analytics_jobs.enqueue(kind, user_id, chatbot_id, full)
+    ANALYTICS_JOBS_ENQUEUED.inc(kind=kind, result="created" if created else "deduplicated")
+    return job, created
+
+def nightly_analytics_refresh():
+    # users who chatted recently and whose summary wasn't already refreshed today
+    users = analytics_store.active_users(ANALYTICS_ACTIVE_DAYS)
+    for user_id, chatbot_id in users:
+        enqueue_analytics_refresh(user_id, chatbot_id)
+    print(f"[JOBS] nightly refresh queued for {len(users)} active users")
+
+def summary_is_stale(state, max_age_s=None):
+    # updated_at is SQLite datetime('now'), i.e. UTC
+    max_age_s = ANALYTICS_STALE_S if max_age_s is None else max_age_s
+    try:
+        updated = datetime.strptime(state["updated_at"], "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return True
+    return (datetime.utcnow() - updated).total_seconds() > max_age_s
+
+analytics_jobs = JobScheduler(
+    {"weekly_topics": lambda user_id, chatbot_id, full: refresh_user_analytics(user_id, chatbot_id, full=full)},
+    workers=ANALYTICS_JOB_WORKERS, nightly=nightly_analytics_refresh, nightly_hour=ANALYTICS_NIGHTLY_HOUR)
     
-def bootstrap_index(data_dir="data/raw"):
+INDEX_PATH = "faiss.index"
+
+def _index_fingerprint(chunks):
+    # the embedder is part of it: vectors from another model don't match either
+    return request_key(EMBED_MODEL, chunks.fingerprint())
+
+def _saved_fingerprint(index_path=INDEX_PATH):
+    # fingerprint recorded next to a saved index, or None (no .meta: saved before they were recorded)
+    try:
+        with open(index_path + ".meta", encoding="utf-8") as f:
+            return json.load(f).get("fingerprint")
+    except (OSError, ValueError):
+        return None
+
+def _write_fingerprint(fingerprint, n_chunks, index_path=INDEX_PATH):
+    with open(index_path + ".meta.tmp", "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "chunks": n_chunks, "saved_at": time.time()}, f)
+    os.replace(index_path + ".meta.tmp", index_path + ".meta")
+
+def _save_index(vec, fingerprint, index_path=INDEX_PATH):
+    # index first, then its fingerprint: a crash in between leaves a mismatch, which rebuilds
+    vec.save_index(index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)  # mmapped readers keep the old inode
+    _write_fingerprint(fingerprint, len(vec.store), index_path)
+
+def bootstrap_index(data_dir="data/raw", mmap_index=False, progress=lambda state: None):
     global retriever, reranker
-    chunks = ingest_dir(data_dir)
-    index_path = "faiss.index"
-    vec = VectorIndex("intfloat/e5-small-v2")
-    if os.path.exists(index_path):
+    progress("ingesting")
+    chunks = ChunkStore.from_chunks(ingest_dir(data_dir))
+    index_path = INDEX_PATH
+    fingerprint = _index_fingerprint(chunks)
+    if mmap_index:
+        # file-backed text/metadata columns, shared by forked workers like the faiss index
+        chunks.save("chunks.store")
+        chunks = ChunkStore.load("chunks.store", mmap=True)
+    print(f"Chunk store: {chunks.memory_report()}")
+    progress("embedding")
+    encoder, cross_encoder = _load_models()
+    vec = VectorIndex(EMBED_MODEL, model=encoder)
+    # a saved index is only reused for the same chunks (data_dir, documents and embedder)
+    saved = _saved_fingerprint(index_path) if os.path.exists(index_path) else ""
+    if saved in (fingerprint, None):
         vec.store = chunks
-        vec.load_index(index_path)
-    else:
+        vec.load_index(index_path, mmap=mmap_index)
+        if saved is None:
+            # no recorded fingerprint: keep the index only if it has one vector per chunk
+            if vec.index.ntotal == len(chunks):
+                _write_fingerprint(fingerprint, len(chunks), index_path)
+            else:
+                vec.index = None
+    if vec.index is None:
         vec.build(chunks)
-    vec.save_index(index_path)
-    retriever = HybridRetriever(chunks, vec)
-    reranker = Reranker("cross-encoder/ms-marco-MiniLM-L-6-v2")
-
-def answer(query: str, retriever, reranker, top_k=8):
-    intent = detect_intent(query)
-    q2 = rewrite_query(query, intent)
-    candidates = retriever.retrieve(q2, top_k=40)
-    ranked = reranker.rerank(q2, candidates, top_k=top_k)
-    ctx = compress_context(ranked, max_chars=3500)
-    ans = call_llm(query, ctx, model=os.getenv("RAG_LLM", "llama3.2:3b"))
-    issues = self_check(ans, query)
-    return ans, issues
+        _save_index(vec, fingerprint, index_path)
+        if mmap_index:
+            vec.load_index(index_path, mmap=True)
+    new_retriever = HybridRetriever(chunks, vec)
+    progress("loading_reranker")
+    new_reranker = Reranker(RERANK_MODEL, model=cross_encoder)
+    retriever, reranker = new_retriever, new_reranker
+
+def warm_up(retriever, reranker):
+    # one dummy query through encoder + cross-encoder so the first real request
+    # doesn't pay for lazy weight loading / kernel selection
+    candidates = retriever.retrieve("warm up query", top_k=2)
+    if candidates:
+        reranker.rerank("warm up query", candidates, top_k=1)
+
+def run_bootstrap(data_dir="data/raw", mmap_index=False):
+    """
+    Build the RAG index and warm up the models, recording progress in rag_status.
+    Never raises: failures are reported through rag_status / GET /api/ready.
+    """
+    with _bootstrap_lock:
+        rag_status["started_at"] = time.time()
+        try:
+            bootstrap_index(data_dir, mmap_index=mmap_index, progress=_set_rag_state)
+            enable_batching(retriever, reranker)
+            _set_rag_state("warming_up")
+            warm_up(retriever, reranker)
+            rag_status["ready_at"] = time.time()
+            _set_rag_state("ready")
+        except Exception as e:
+            _set_rag_state("failed", f"{type(e).__name__}: {e}")
+    return rag_ready()
+
+def reload_index(data_dir="data/raw"):
+    """
+    Rebuild the index from data_dir next to the live one and swap it in.
+    The loaded encoder and cross-encoder are reused; only the chunks, embeddings,
+    faiss index and BM25 are rebuilt. Writes the new faiss.index atomically, with
+    the fingerprint of its chunks so a restart on other documents rebuilds it.
+    """
+    reload_status.update(state="building", error=None, started_at=time.time(), finished_at=None)
+    try:
+        chunks = ChunkStore.from_chunks(ingest_dir(data_dir))
+        if not len(chunks):
+            raise ValueError(f"No documents found in {data_dir}")
+        old_retriever, live_reranker = retriever, reranker
+        encoder, cross_encoder = _load_models(old_retriever.vec.model if old_retriever is not None else None)
+        vec = VectorIndex(EMBED_MODEL, model=encoder)
+        vec.build(chunks)
+        _save_index(vec, _index_fingerprint(chunks))
+        new_retriever = HybridRetriever(chunks, vec)
+        if live_reranker is None:
+            live_reranker = Reranker(RERANK_MODEL, model=cross_encoder)
+        enable_batching(new_retriever, live_reranker)
+        warm_up(new_retriever, live_reranker)
+        del old_retriever
+        reload_status["state"] = "draining"
+        swap_index(new_retriever, live_reranker)
+        if rag_status["state"] != "ready":
+            rag_status["ready_at"] = time.time()
+            _set_rag_state("ready")
+        reload_status.update(state="idle", finished_at=time.time())
+    except Exception as e:
+        reload_status.update(state="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time())
+        print(f"[RAG] reload failed: {e}")
+
+def _admin_allowed():
+    # ADMIN_TOKEN set: require it in X-Admin-Token; otherwise only local callers
+    token = os.getenv("ADMIN_TOKEN")
+    if token:
+        return request.headers.get("X-Admin-Token") == token
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+def start_background_bootstrap(data_dir="data/raw"):
+    """Start the RAG bootstrap and the analytics job scheduler; the API serves meanwhile."""
+    analytics_jobs.start()
+    def _run():
+        run_bootstrap(data_dir)
+        # after the bootstrap so the refresh can use the local classifier
+        try:
+            enqueue_analytics_refresh(DEFAULT_ANALYTICS_USER)
+        except Exception as e:
+            print(f"Warning: weekly topics precompute failed: {e}")
+    t = threading.Thread(target=_run, name="rag-bootstrap", daemon=True)
+    t.start()
+    return t
+
+def preload(data_dir="data/raw"):
+    """
+    Load the database, models and a memory-mapped faiss index in the current
+    process. Called by wsgi.py in the gunicorn master (preload_app) so forked
+    workers share these pages copy-on-write instead of loading their own.
+    """
+    from database import ensure_database
+    ensure_database()
+    if not run_bootstrap(data_dir, mmap_index=True):
+        print(f"Warning: RAG preload failed (workers will serve without /api/ask): {rag_status['error']}")
+    # Move everything allocated so far out of the GC's tracked generations, so
+    # collections in the workers don't touch (and un-share) the parent's objects
+    gc.collect()
+    gc.freeze()
+
+RAG_DEGRADED = metrics.REGISTRY.counter(
+    "rag_degraded_total", "answer() stages degraded to meet the request deadline", ["stage"])
+
+ask_admission = AdmissionController(ASK_MAX_CONCURRENT, ASK_QUEUE_MAX, ASK_QUEUE_WAIT_S, ASK_QUEUE_PER_USER)
+ASK_QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "rag_admission_wait_seconds", "Time /api/ask requests spent queued before admission")
+ASK_REJECTED = metrics.REGISTRY.counter(
+    "rag_admission_rejected_total", "/api/ask requests rejected with 429", ["reason"])
+metrics.REGISTRY.callback("rag_admission_active", "/api/ask requests running the pipeline",
+                          lambda: ask_admission.stats()["active"])
+metrics.REGISTRY.callback("rag_admission_queue_depth", "/api/ask requests waiting for admission",
+                          lambda: ask_admission.stats()["queued"])
+
+def _estimate(stage, default_s, q=0.5):
+    # typical stage latency from the live histogram, or a default before any samples
+    est = metrics.RAG_STAGE_SECONDS.quantile(q, stage=stage)
+    return est if est is not None and est != float("inf") else default_s
+
+def answer(query: str, retriever, reranker, top_k=8, deadline=None):
+    """
+    Run the RAG pipeline within deadline (a Deadline; defaults to RAG_DEADLINE_S).
+    Returns (answer, checks, degraded) where degraded lists the stages that were
+    skipped or reduced to stay within budget: "retrieve", "rerank", "context", "generate".
+    A retrieval timeout skips generation and returns passages_answer([]).
+    """
+    deadline = deadline or Deadline(DEADLINE_S)
+    degraded = []
+
+    def degrade(stage):
+        degraded.append(stage)
+        RAG_DEGRADED.inc(stage=stage)
+
+    # each stage feeds the rag_stage_seconds histogram served at /api/metrics;
+    # deadline.active() bounds inference-pool and micro-batch waits on this thread
+    with deadline.active(), metrics.stage("total"):
+        with metrics.stage("detect_intent"):
+            intent = detect_intent(query)
+        with metrics.stage("rewrite_query"):
+            q2 = rewrite_query(query, intent)
+        # the encoder / cross-encoder wait no longer than the deadline, then raise a timeout
+        try:
+            with metrics.stage("retrieve"):
+                candidates = retriever.retrieve(q2, top_k=40)
+        except (TimeoutError, FuturesTimeout) as e:
+            print(f"[RAG] retrieval exceeded the deadline: {e}")
+            degrade("retrieve")
+            candidates = []
+        if "retrieve" in degraded:
+            ranked = []
+        elif deadline.remaining() - _estimate("rerank", 0.5, q=0.95) < MIN_GENERATE_S:
+            degrade("rerank")
+            ranked = candidates[:top_k]
+        else:
+            try:
+                with metrics.stage("rerank"):
+                    ranked = reranker.rerank(q2, candidates, top_k=top_k)
+            except (TimeoutError, FuturesTimeout) as e:
+                print(f"[RAG] reranking exceeded the deadline: {e}")
+                degrade("rerank")
+                ranked = candidates[:top_k]
+        with metrics.stage("compress_context"):
+            ctx = compress_context(ranked, max_chars=None)
+            # prefill time scales with prompt size: shrink the context when the
+            # remaining budget is below a typical generation time
+            share = min(1.0, deadline.remaining() / _estimate("call_llm", 8.0))
+            budget = CONTEXT_TOKENS if share >= 1.0 else max(CONTEXT_TOKENS // 4, int(CONTEXT_TOKENS * share))
+            if budget < CONTEXT_TOKENS:
+                degrade("context")
+            ctx = pack_context(query, ctx, max_tokens=budget)
+        ans = None
+        # without retrieved passages there is nothing to ground an answer on
+        if "retrieve" not in degraded and deadline.remaining() >= MIN_GENERATE_S:
+            try:
+                with metrics.stage("call_llm"):
+                    ans = call_llm(query, ctx, model=os.getenv("RAG_LLM", "llama3.2:3b"),
+                                   timeout=deadline.timeout(60))
+            except (requests.Timeout, TimeoutError, NoBackendAvailable) as e:
+                print(f"[RAG] generation exceeded the deadline: {e}")
+        if ans is None:
+            degrade("generate")
+            ans = passages_answer(ctx)
+        with metrics.stage("self_check"):
+            issues = self_check(ans, query)
+    return ans, issues, degraded
 
 @app.route('/api/ask', methods=['POST'])
 def ask():
@@ -361,21 +1097,159 @@ def ask():
     user_query = data.get('query', '')
     if not user_query:
         return jsonify({'error': 'No query provided'}), 400
-    if retriever is None or reranker is None:
-        return jsonify({'error': 'RAG index not initialized'}), 500
+    # clients may ask for a tighter budget than RAG_DEADLINE_S, never a looser one
     try:
-        ans, issues = answer(user_query, retriever, reranker)
-        return jsonify({'answer': ans, 'checks': issues})
+        budget_s = min(float(data.get('deadline_s') or DEADLINE_S), DEADLINE_S)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'deadline_s must be a number of seconds'}), 400
+    if not rag_ready():
+        resp = jsonify({
+            'error': 'Service Unavailable',
+            'message': f"RAG index is not ready (state: {rag_status['state']})",
+            'status': 503
+        })
+        return resp, 503, {'Retry-After': str(RETRY_AFTER_S)}
+    # queue wait counts against the request's deadline
+    deadline = Deadline(budget_s)
+    user_key = data.get('user_id') or request.remote_addr
+    try:
+        with ask_admission.admit(user_key, timeout=deadline.remaining()) as waited_s:
+            ASK_QUEUE_WAIT.observe(waited_s)
+            with use_index() as (live_retriever, live_reranker):
+                ans, issues, degraded = answer(user_query, live_retriever, live_reranker,
+                                               deadline=deadline)
+        return jsonify({'answer': ans, 'checks': issues, 'degraded': degraded})
+    except Rejected as e:
+        ASK_REJECTED.inc(reason=e.reason)
+        resp = jsonify({
+            'error': 'Too Many Requests',
+            'message': f"Server busy: {e}",
+            'status': 429
+        })
+        return resp, 429, {'Retry-After': str(max(1, int(ASK_QUEUE_WAIT_S)))}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/weekly_topics', methods=['GET'])
 def weekly_topics():
-    global weekly_topics_cache
-    if weekly_topics_cache is None:
-        # Fallback: process if not available
-        weekly_topics_cache = process_weekly_topics()
-    return jsonify(weekly_topics_cache)
+    """
+    Pre-aggregated Bloom percentages and strongest/weakest topics for ?user_id=
+    (and optional ?chatbot_id=, default 3), served from the last completed refresh.
+    ?refresh=1 (new messages) or ?refresh=full (also rechecks messages older than
+    the watermark) queues a background refresh, as does a summary older than
+    ANALYTICS_STALE_S; the response then carries the job as refresh_job.
+    A user with no summary yet gets 202 and a job to poll at /api/jobs/<id>.
+    ?weeks_ago=N (0 = the last 7 days) or ?start=&end= (ISO dates, end exclusive)
+    restrict the counts to messages sent in that window, aggregated from the
+    stored classifications (no NALA calls; strongest/weakest are null).
+    """
+    user_id = request.args.get('user_id', type=int) or DEFAULT_ANALYTICS_USER
+    chatbot_id = request.args.get('chatbot_id', type=int) or 3
+    start, end = request.args.get('start'), request.args.get('end')
+    try:
+        if request.args.get('weeks_ago') is not None:
+            weeks_ago = int(request.args['weeks_ago'])
+            if weeks_ago < 0:
+                raise ValueError(weeks_ago)
+            start, end = week_window(weeks_ago)
+        for value in (start, end):
+            if value:
+                datetime.fromisoformat(value)
+    except ValueError:
+        return jsonify({'error': 'Bad Request', 'status': 400,
+                        'message': 'weeks_ago must be a non-negative integer and start/end ISO dates'}), 400
+    try:
+        state = analytics_store.get_user_analytics(user_id, chatbot_id)
+        refresh = request.args.get('refresh')
+        if state is None or state["summary"] is None:
+            job, _ = enqueue_analytics_refresh(user_id, chatbot_id, full=refresh == 'full')
+            return jsonify({'status': 'pending', 'job': job}), 202, {'Retry-After': str(RETRY_AFTER_S)}
+        summary = state["summary"]
+        if start or end:
+            summary = window_summary(summary, user_id, chatbot_id, start, end)
+        if refresh in ('1', 'full') or summary_is_stale(state):
+            job, _ = enqueue_analytics_refresh(user_id, chatbot_id, full=refresh == 'full')
+            return jsonify({**summary, 'refresh_job': job})
+        return jsonify(summary)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """
+    Queue a background analytics job: {"user_id": ..., "chatbot_id": 3,
+    "kind": "weekly_topics", "full": false}. Returns 202 with the job; an
+    identical queued or running job is returned instead of a new one
+    (deduplicated: true).
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind', 'weekly_topics')
+    if kind not in analytics_jobs.handlers:
+        return jsonify({'error': 'Bad Request', 'message': f"Unknown job kind: {kind}", 'status': 400}), 400
+    try:
+        user_id = int(data['user_id'])
+        chatbot_id = int(data.get('chatbot_id', 3))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Bad Request', 'message': 'user_id (integer) is required', 'status': 400}), 400
+    try:
+        job, created = enqueue_analytics_refresh(user_id, chatbot_id, full=bool(data.get('full')), kind=kind)
+        return jsonify({'job': job, 'deduplicated': not created}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of a background job: queued, running, done or failed (with error)"""
+    try:
+        job = get_job(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Not Found', 'message': f"Job {job_id} not found", 'status': 404}), 404
+    return jsonify({'job': job})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of stage/DB latency histograms and counters"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """
+    POST: rebuild the retrieval index in the background and swap it in
+    without dropping requests (single-process servers only; refused under
+    gunicorn). GET: status of the last reload.
+    """
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden', 'message': 'Admin access required', 'status': 403}), 403
+    if request.method == 'GET':
+        return jsonify(reload_status)
+    if request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        # preload_app: workers are forked from the master's index, so a swap here would
+        # reach this worker only (and a HUP re-forks the old index)
+        return jsonify({'error': 'Conflict', 'status': 409,
+                        'message': 'Reload is per process; under gunicorn restart the master instead '
+                                   '(see docs/PRODUCTION_SERVING.md)'}), 409
+    if _bootstrap_lock.locked() or not _reload_lock.acquire(blocking=False):
+        return jsonify({'error': 'Conflict', 'message': 'A reload or bootstrap is already running', 'status': 409}), 409
+    data_dir = (request.get_json(silent=True) or {}).get('data_dir', 'data/raw')
+    reload_status["state"] = "building"
+
+    def _run():
+        try:
+            reload_index(data_dir)
+        finally:
+            _reload_lock.release()
+    threading.Thread(target=_run, name="rag-reload", daemon=True).start()
+    return jsonify(reload_status), 202
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness of the RAG pipeline: 200 once /api/ask can be served, else 503"""
+    body = {'ready': rag_ready(), **rag_status}
+    if body['ready']:
+        return jsonify(body)
+    return jsonify(body), 503, {'Retry-After': str(RETRY_AFTER_S)}
 
 @app.route('/api/health', methods=['GET'])
 def health():
@@ -386,15 +1260,11 @@ def health():
     from database import ensure_database
     ensure_database()
     
-    # Initialize RAG (optional - can be slow, server will start even if this fails)
-    try:
-        print("Initializing RAG index (this may take a moment)...")
-        bootstrap_index("data/raw")  # or your actual data dir
-        weekly_topics_cache = process_weekly_topics()
-        print("RAG index initialized successfully!")
-    except Exception as e:
-        print(f"Warning: RAG initialization failed (server will still start): {e}")
-        weekly_topics_cache = None
+    # Initialize RAG in the background; /api/ask answers 503 until GET /api/ready is 200.
+    # With the debug reloader only the serving child (WERKZEUG_RUN_MAIN) builds the index.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        print("Initializing RAG index in the background...")
+        start_background_bootstrap("data/raw")
     
     # Use port 5001 to avoid conflict with macOS AirPlay Receiver on port 5000
     port = int(os.getenv('FLASK_PORT', '5001'))
@@ -407,6 +1277,7 @@ def health():
     print("  GET  /api/challenges/:id")
     print("  POST /api/challenges/:id/attempts")
     print("  GET  /api/health")
+    print("  GET  /api/ready")
     print("="*60 + "\n")
     
     app.run(debug=True, port=port, host='0.0.0.0')  
\ No newline at end of file
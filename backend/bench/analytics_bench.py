@@ -0,0 +1,119 @@
+# bench/analytics_bench.py
+"""
+Offline benchmark of the weekly-topics analytics path.
+
+Starts a stub NALA server (bench.stub_nala) with synthetic chat histories and
+drives backend.process_weekly_topics for every user against a throwaway
+SQLite database, in three passes:
+
+- cold: nothing classified yet;
+- warm: same histories again (only the watermark check and summary rebuild);
+- incremental: after --grow new history rows per user.
+
+Reports wall time, per-user refresh latency and the NALA calls made per pass
+(by endpoint and by LLM prompt kind), as JSON comparable across commits.
+
+    cd backend
+    python -m bench.analytics_bench --users 20 --messages 200 --llm-ms 300 --out bench_analytics.json
+
+The RAG index isn't loaded, so every message goes to the (stub) LLM; the
+local embedding classifier is not exercised.
+"""
+import argparse, contextlib, io, os, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.stats import summarize, run_info, write_json, print_table
+from bench.stub_nala import start_stub
+
+def _delta(after: dict, before: dict) -> dict:
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+def run(args) -> dict:
+    server, stub = start_stub(0, users=args.users, messages=args.messages, days=args.days,
+                              llm_ms=args.llm_ms, history_ms=args.history_ms, topics_ms=args.topics_ms,
+                              llm_error_rate=args.llm_error_rate, history_error_rate=args.history_error_rate,
+                              topics_error_rate=args.topics_error_rate, paging=not args.no_paging, seed=args.seed)
+    # read at import by backend / ragcore; the disk cache would turn repeat runs into cache hits
+    os.environ["BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["API_KEY"] = "bench"
+    os.environ["LLM_CACHE"] = "0"
+    os.environ["LLM_FALLBACK"] = "0"  # never fall back to Ollama
+    os.environ["CLASSIFY_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["CLASSIFY_CONCURRENCY"] = str(args.concurrency)
+    os.environ["CHAT_HISTORY_PAGE_SIZE"] = str(args.page_size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        import database
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_database()
+        import backend
+        backend.llm_cache = None
+
+        passes = {}
+        for name in ("cold", "warm", "incremental"):
+            if name == "incremental":
+                stub.messages += args.grow
+            before = stub.snapshot()
+            classified_before = {p: backend.CLASSIFIED_MESSAGES.value(path=p) for p in ("llm", "embedding", "failed")}
+            durations, failed = [], 0
+            t0 = time.perf_counter()
+            for user_id in range(1, args.users + 1):
+                t = time.perf_counter()
+                # backend logs every page and classification; keep the report readable
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                    try:
+                        backend.process_weekly_topics(user_id, chatbot_id=3)
+                    except Exception as e:
+                        failed += 1
+                        print(f"[{name}] user {user_id} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                durations.append(time.perf_counter() - t)
+            wall_s = time.perf_counter() - t0
+            after = stub.snapshot()
+            calls = _delta(after["calls"], before["calls"])
+            passes[name] = {
+                "wall_s": round(wall_s, 3),
+                "per_user": summarize(durations),
+                "failed_users": failed,
+                "calls": calls,
+                "errors": _delta(after["errors"], before["errors"]),
+                "rows_served": after["rows_served"] - before["rows_served"],
+                "classified": {p: backend.CLASSIFIED_MESSAGES.value(path=p) - v for p, v in classified_before.items()},
+            }
+    server.shutdown()
+
+    result = run_info(vars(args))
+    result["history"] = {"users": args.users, "rows_per_user": args.messages, "grow": args.grow}
+    result["passes"] = passes
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=200, help="history rows per user (half are user messages)")
+    parser.add_argument("--grow", type=int, default=20, help="rows added per user before the incremental pass")
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="stub /api/llm latency")
+    parser.add_argument("--history-ms", type=float, default=50.0, help="stub /api/chathistory latency per page")
+    parser.add_argument("--topics-ms", type=float, default=20.0, help="stub /api/topiclist latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--history-error-rate", type=float, default=0.0)
+    parser.add_argument("--topics-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-paging", action="store_true", help="stub ignores limit/offset")
+    parser.add_argument("--page-size", type=int, default=200, help="CHAT_HISTORY_PAGE_SIZE")
+    parser.add_argument("--batch-size", type=int, default=10, help="CLASSIFY_BATCH_SIZE")
+    parser.add_argument("--concurrency", type=int, default=4, help="CLASSIFY_CONCURRENCY")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--verbose", action="store_true", help="show the backend's own logging")
+    parser.add_argument("--out", default="bench_analytics.json", help="JSON output path, or - for stdout")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_table({name: p["per_user"] for name, p in result["passes"].items()},
+                f"process_weekly_topics per user ({args.users} users, commit {result['commit']})")
+    for name, p in result["passes"].items():
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(p["calls"].items()))
+        print(f"{name:<12} wall {p['wall_s']:.2f}s  calls: {calls or 'none'}  "
+              f"errors: {sum(p['errors'].values())}  failed users: {p['failed_users']}")
+    write_json(args.out, result)
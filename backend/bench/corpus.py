@@ -0,0 +1,66 @@
+# bench/corpus.py
+"""
+Deterministic synthetic corpus for benchmarks: course-like .txt documents
+built from a fixed vocabulary, plus queries that target known documents.
+
+    python -m bench.corpus --out /tmp/corpus --docs 200 --words 1500
+"""
+import argparse, random
+from pathlib import Path
+
+TOPICS = {
+    "kolb": ["concrete", "experience", "reflective", "observation", "abstract", "conceptualization",
+             "active", "experimentation", "learning", "cycle", "diverging", "assimilating"],
+    "bloom": ["remember", "understand", "apply", "analyze", "evaluate", "create",
+              "taxonomy", "cognitive", "objective", "domain", "higher-order", "skills"],
+    "complex": ["complex", "number", "imaginary", "real", "part", "modulus", "argument",
+                "conjugate", "polar", "form", "euler", "root"],
+    "matrix": ["matrix", "determinant", "inverse", "eigenvalue", "eigenvector", "linear",
+               "system", "row", "column", "rank", "transpose", "identity"],
+}
+FILLER = ["the", "a", "of", "and", "in", "to", "is", "for", "with", "as", "by", "this",
+          "students", "course", "method", "example", "result", "section", "chapter", "we"]
+
+def _sentence(rng: random.Random, topic_words: list[str]) -> str:
+    n = rng.randint(8, 22)
+    words = [rng.choice(topic_words) if rng.random() < 0.35 else rng.choice(FILLER) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+def generate_corpus(out_dir: str, n_docs=100, words_per_doc=1200, seed=13) -> list[dict]:
+    """Write n_docs .txt files to out_dir; returns [{"filename", "topic"}] for each."""
+    rng = random.Random(seed)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    names = list(TOPICS)
+    docs = []
+    for i in range(n_docs):
+        topic = names[i % len(names)]
+        sents, n = [], 0
+        while n < words_per_doc:
+            s = _sentence(rng, TOPICS[topic])
+            sents.append(s); n += len(s.split())
+        name = f"doc_{i:05d}_{topic}.txt"
+        (out / name).write_text(" ".join(sents), encoding="utf-8")
+        docs.append({"filename": name, "topic": topic})
+    return docs
+
+def generate_queries(n=50, seed=7) -> list[dict]:
+    rng = random.Random(seed)
+    names = list(TOPICS)
+    qs = []
+    for i in range(n):
+        topic = names[i % len(names)]
+        terms = rng.sample(TOPICS[topic], 3)
+        qs.append({"query": f"What is the relationship between {terms[0]}, {terms[1]} and {terms[2]}?",
+                   "topic": topic})
+    return qs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--words", type=int, default=1200)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    docs = generate_corpus(args.out, args.docs, args.words, args.seed)
+    print(f"Wrote {len(docs)} documents to {args.out}")
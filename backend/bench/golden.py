@@ -0,0 +1,203 @@
+# bench/golden.py
+"""
+Retrieval quality and latency regression check on a golden query set.
+
+Each query is labelled with an evidence passage from data/raw; a retrieved
+chunk is relevant when it contains that passage, so labels survive re-chunking
+and index rebuilds. The labels in bench/golden_labels.json are hand-reviewed
+questions on the documents data/raw actually holds (Bloom's taxonomy, Kolb).
+
+data/challenges.csv holds maths questions (integration, complex numbers,
+vectors...) whose course material is not in data/raw, so labelling them from
+it (--relabel) matches only a few queries, and wrongly. --relabel is for when
+that material is added; it refuses to write fewer than --min-labelled labels.
+
+    cd backend
+    python -m bench.golden --save-baseline bench_golden_baseline.json   # on main
+    python -m bench.golden --baseline bench_golden_baseline.json        # on a branch
+
+Exits 1 when recall@k / MRR drop, or stage p95 latency grows, beyond the
+thresholds, and 2 when the labels can't support the check (too few labelled
+queries, or evidence no longer found in data/raw).
+"""
+import argparse, csv, json, os, re, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.stats import summarize, run_info, write_json, print_table
+
+HERE = Path(__file__).resolve().parent
+LABELS_PATH = HERE / "golden_labels.json"
+_STOP = {"the", "and", "for", "are", "was", "what", "which", "how", "why", "with", "that", "this",
+         "from", "does", "into", "according", "text", "when", "where", "who", "its", "their"}
+
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+def _terms(text: str) -> set[str]:
+    return {w for w in re.findall(r"\w+", text.lower()) if len(w) > 2 and w not in _STOP}
+
+def load_challenges(csv_path: str) -> list[dict]:
+    with open(csv_path, encoding="utf-8-sig") as f:
+        return [r for r in csv.DictReader(f) if r.get("question")]
+
+def build_labels(challenges: list[dict], chunks: list[dict], min_coverage=0.5) -> list[dict]:
+    """Pick one evidence sentence per challenge; challenges without one are left unlabelled."""
+    from nltk.tokenize import sent_tokenize
+    sentences = {}
+    for c in chunks:
+        for s in sent_tokenize(c["text"]):
+            if len(s.split()) >= 5:
+                sentences.setdefault(_norm(s), c["meta"].get("filename", "unknown"))
+    sent_terms = [(s, f, _terms(s)) for s, f in sentences.items()]
+    labels = []
+    for ch in challenges:
+        want = _terms(ch["question"]) | _terms(ch.get("ground_truth_answer", ""))
+        best, best_cov, best_file = None, 0.0, None
+        if want:
+            for s, f, t in sent_terms:
+                cov = len(want & t) / len(want)
+                if cov > best_cov:
+                    best, best_cov, best_file = s, cov, f
+        labels.append({
+            "question": ch["question"],
+            "category": ch.get("category"),
+            "bloom_level": ch.get("bloom_level"),
+            "evidence": best if best_cov >= min_coverage else None,
+            "evidence_file": best_file if best_cov >= min_coverage else None,
+            "coverage": round(best_cov, 3),
+        })
+    return labels
+
+def _rank_of_first_relevant(hits: list[dict], evidence: str):
+    for i, h in enumerate(hits, 1):
+        if evidence in _norm(h["chunk"]["text"]):
+            return i
+    return None
+
+def evaluate(labels, retriever, reranker, ks=(1, 3, 5, 8), retrieve_k=40, rerank_k=8) -> dict:
+    labelled = [label for label in labels if label["evidence"]]
+    retrieve_s, rerank_s = [], []
+    retrieve_found, ranks = 0, []
+    for label in labelled:
+        t = time.perf_counter()
+        candidates = retriever.retrieve(label["question"], top_k=retrieve_k)
+        retrieve_s.append(time.perf_counter() - t)
+        if _rank_of_first_relevant(candidates, label["evidence"]) is not None:
+            retrieve_found += 1
+        t = time.perf_counter()
+        ranked = reranker.rerank(label["question"], candidates, top_k=rerank_k)
+        rerank_s.append(time.perf_counter() - t)
+        ranks.append(_rank_of_first_relevant(ranked, label["evidence"]))
+    n = len(labelled) or 1
+    quality = {f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / n, 4) for k in ks}
+    quality[f"retrieve_recall@{retrieve_k}"] = round(retrieve_found / n, 4)
+    quality["mrr"] = round(sum(1.0 / r for r in ranks if r) / n, 4)
+    return {
+        "queries": len(labels),
+        "labelled": len(labelled),
+        "quality": quality,
+        "latency": {"retrieve": summarize(retrieve_s), "rerank": summarize(rerank_s)},
+    }
+
+def check_labels(labels: list[dict], chunks: list[dict], min_labelled: int) -> list[str]:
+    """Reasons the labels can't gate a run: too few labelled queries, or evidence missing from the chunks."""
+    labelled = [label for label in labels if label["evidence"]]
+    problems = []
+    if len(labelled) < min_labelled:
+        problems.append(f"only {len(labelled)}/{len(labels)} queries are labelled (need {min_labelled})")
+    texts = [_norm(c["text"]) for c in chunks]
+    for label in labelled:
+        if not any(label["evidence"] in t for t in texts):
+            problems.append(f"evidence for {label['question']!r} not found in any chunk")
+    return problems
+
+def check_regressions(current: dict, baseline: dict, max_quality_drop: float, max_latency_increase: float) -> list[str]:
+    failures = []
+    for metric, base in baseline.get("quality", {}).items():
+        cur = current["quality"].get(metric)
+        if cur is not None and base - cur > max_quality_drop:
+            failures.append(f"{metric} dropped {base:.4f} -> {cur:.4f} (allowed {max_quality_drop})")
+    for stage, base in baseline.get("latency", {}).items():
+        cur = current["latency"].get(stage, {})
+        if base.get("p95_ms") and cur.get("p95_ms") and cur["p95_ms"] > base["p95_ms"] * (1 + max_latency_increase):
+            failures.append(f"{stage} p95 {base['p95_ms']:.1f}ms -> {cur['p95_ms']:.1f}ms "
+                            f"(allowed +{max_latency_increase:.0%})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="data/challenges.csv")
+    parser.add_argument("--data-dir", default="data/raw")
+    parser.add_argument("--embed-model", default="intfloat/e5-small-v2")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--labels", default=str(LABELS_PATH))
+    parser.add_argument("--relabel", action="store_true", help="rebuild evidence labels from data/raw")
+    parser.add_argument("--min-coverage", type=float, default=0.5, help="term coverage needed to label a query")
+    parser.add_argument("--min-labelled", type=int, default=20, help="fail when fewer queries are labelled")
+    parser.add_argument("--baseline", help="compare against this result file and fail on regressions")
+    parser.add_argument("--save-baseline", help="write this run as the new baseline")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02, help="absolute recall/MRR drop allowed")
+    parser.add_argument("--max-latency-increase", type=float, default=0.25, help="relative p95 increase allowed")
+    parser.add_argument("--out", default="bench_golden.json")
+    args = parser.parse_args()
+
+    from ragcore.ingest import ingest_dir
+    from ragcore.embed import VectorIndex
+    from ragcore.retrieve import HybridRetriever
+    from ragcore.rerank import Reranker
+
+    chunks = ingest_dir(args.data_dir)
+    if args.relabel or not os.path.exists(args.labels):
+        labels = build_labels(load_challenges(args.csv), chunks, args.min_coverage)
+        problems = check_labels(labels, chunks, args.min_labelled)
+        if problems:
+            # e.g. challenges.csv asks about maths that data/raw doesn't cover; keep the existing labels
+            print(f"Not writing {args.labels}: {problems[0]}. Add the course material the questions "
+                  f"come from to {args.data_dir}, or review the labels by hand.", file=sys.stderr)
+            sys.exit(2)
+        with open(args.labels, "w", encoding="utf-8") as f:
+            json.dump(labels, f, indent=2, ensure_ascii=False)
+        print(f"Labelled {sum(1 for label in labels if label['evidence'])}/{len(labels)} queries -> {args.labels}")
+    else:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+        problems = check_labels(labels, chunks, args.min_labelled)
+        if problems:
+            print(f"Golden labels in {args.labels} can't gate this run:", file=sys.stderr)
+            for msg in problems:
+                print(f"  - {msg}", file=sys.stderr)
+            sys.exit(2)
+
+    t = time.perf_counter()
+    vec = VectorIndex(args.embed_model)
+    vec.build(chunks)
+    retriever = HybridRetriever(chunks, vec)
+    build_s = time.perf_counter() - t
+    reranker = Reranker(args.rerank_model)
+
+    result = run_info({k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline")})
+    result.update(evaluate(labels, retriever, reranker))
+    result["build_s"] = round(build_s, 3)
+
+    print_table(result["latency"], f"Golden set ({result['labelled']}/{result['queries']} labelled queries)")
+    for metric, value in result["quality"].items():
+        print(f"{metric:<22}{value:.4f}")
+    write_json(args.out, result)
+    if args.save_baseline:
+        write_json(args.save_baseline, result)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = check_regressions(result, baseline, args.max_quality_drop, args.max_latency_increase)
+        if failures:
+            print("\nREGRESSIONS:")
+            for msg in failures:
+                print(f"  - {msg}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (commit {baseline.get('commit')})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# bench/rag_bench.py
+"""
+Offline end-to-end benchmark of the ragcore pipeline.
+
+Generates a synthetic corpus, starts a stub Ollama server, then times each
+stage: ingest, build (embed + faiss + BM25), retrieve, rerank, compress
+(dedupe + token packing) and generate. Writes machine-readable JSON so runs
+on the same box can be compared across commits.
+
+    cd backend
+    HF_HUB_OFFLINE=1 python -m bench.rag_bench --docs 200 --queries 50 --out bench_rag.json
+
+Needs the embedding and cross-encoder models in the local Hugging Face cache;
+no other network access is used.
+"""
+import argparse, os, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import generate_corpus, generate_queries
+from bench.stats import summarize, run_info, write_json, print_table
+from bench.stub_ollama import start_stub
+
+def run(args) -> dict:
+    # the stub replaces Ollama; the disk cache would turn repeat runs into cache hits
+    server, stub = start_stub(0, ttft_ms=args.ttft_ms, tokens_per_s=args.tokens_per_s,
+                              reply_tokens=args.reply_tokens)
+    os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["LLM_CACHE"] = "0"
+    os.environ["LLM_FALLBACK"] = "0"  # never fall back to the remote NALA API
+
+    from ragcore import generate
+    from ragcore.ingest import ingest_dir
+    from ragcore.chunkstore import ChunkStore, dict_chunks_bytes
+    from ragcore.embed import VectorIndex
+    from ragcore.retrieve import HybridRetriever
+    from ragcore.rerank import Reranker
+    from ragcore.orchestrate import detect_intent, rewrite_query, compress_context, pack_context
+    generate.ollama_backend.base_url = os.environ["OLLAMA_BASE_URL"]
+    generate.llm_cache = None
+
+    timings = {k: [] for k in ["ingest", "build", "retrieve", "rerank", "compress", "generate", "total"]}
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_corpus(tmp, args.docs, args.words, args.seed)
+
+        t = time.perf_counter()
+        raw_chunks = ingest_dir(tmp)
+        chunks = ChunkStore.from_chunks(raw_chunks)
+        timings["ingest"].append(time.perf_counter() - t)
+        memory = chunks.memory_report()
+        memory["dict_bytes_per_chunk"] = round(dict_chunks_bytes(raw_chunks) / max(1, len(raw_chunks)), 1)
+        del raw_chunks
+
+        t = time.perf_counter()
+        vec = VectorIndex(args.embed_model)
+        vec.build(chunks)
+        retriever = HybridRetriever(chunks, vec)
+        timings["build"].append(time.perf_counter() - t)
+        reranker = Reranker(args.rerank_model)
+
+        queries = generate_queries(args.queries, args.seed)
+        # one untimed query so lazy model initialisation isn't charged to the first sample
+        warm = retriever.retrieve(queries[0]["query"], top_k=4)
+        reranker.rerank(queries[0]["query"], warm, top_k=2)
+
+        for q in queries:
+            query = q["query"]
+            t0 = time.perf_counter()
+            q2 = rewrite_query(query, detect_intent(query))
+            t = time.perf_counter()
+            candidates = retriever.retrieve(q2, top_k=40)
+            timings["retrieve"].append(time.perf_counter() - t)
+            t = time.perf_counter()
+            ranked = reranker.rerank(q2, candidates, top_k=args.top_k)
+            timings["rerank"].append(time.perf_counter() - t)
+            t = time.perf_counter()
+            ctx = pack_context(query, compress_context(ranked, max_chars=None), max_tokens=args.context_tokens)
+            timings["compress"].append(time.perf_counter() - t)
+            t = time.perf_counter()
+            if not args.skip_generate:
+                generate.call_llm(query, ctx, model="stub")
+            timings["generate"].append(time.perf_counter() - t)
+            timings["total"].append(time.perf_counter() - t0)
+    server.shutdown()
+
+    result = run_info(vars(args))
+    result["corpus"] = {"docs": args.docs, "chunks": len(chunks)}
+    result["chunk_memory"] = memory
+    result["stages"] = {k: summarize(v) for k, v in timings.items()}
+    result["stub_requests"] = stub.requests
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100, help="synthetic documents to generate")
+    parser.add_argument("--words", type=int, default=1200, help="words per document")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--context-tokens", type=int, default=1200)
+    parser.add_argument("--embed-model", default="intfloat/e5-small-v2")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="stub LLM time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=40.0, help="stub LLM decode rate")
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--skip-generate", action="store_true", help="time retrieval only")
+    parser.add_argument("--out", default="bench_rag.json", help="JSON output path, or - for stdout")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_table(result["stages"], f"RAG pipeline ({result['corpus']['chunks']} chunks, commit {result['commit']})")
+    mem = result["chunk_memory"]
+    print(f"chunk store: {mem['bytes_per_chunk']:.0f} B/chunk (list of dicts: {mem['dict_bytes_per_chunk']:.0f} B/chunk)")
+    write_json(args.out, result)
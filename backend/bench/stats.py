@@ -0,0 +1,60 @@
+# bench/stats.py
+import json, os, platform, subprocess, time
+
+def percentile(xs: list[float], q: float) -> float:
+    # nearest-rank percentile, q in [0, 100]
+    if not xs:
+        return 0.0
+    s = sorted(xs)
+    k = max(0, min(len(s) - 1, int(round(q / 100.0 * len(s) + 0.5)) - 1))
+    return s[k]
+
+def summarize(samples_s: list[float]) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ms = [x * 1000.0 for x in samples_s]
+    if not ms:
+        return {"n": 0}
+    return {
+        "n": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def run_info(config: dict) -> dict:
+    # enough context to compare two result files from the same box
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+    }
+
+def write_json(path: str, data: dict):
+    if path == "-":
+        print(json.dumps(data, indent=2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    print(f"Results written to {path}")
+
+def print_table(rows: dict, title: str):
+    print(f"\n=== {title} ===")
+    print(f"{'stage':<18}{'n':>6}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, r in rows.items():
+        if not r.get("n"):
+            print(f"{name:<18}{0:>6}")
+            continue
+        print(f"{name:<18}{r['n']:>6}{r['mean_ms']:>10.1f}{r['p50_ms']:>10.1f}"
+              f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
@@ -0,0 +1,245 @@
+# bench/stub_nala.py
+"""
+Local stand-in for the NALA API with configurable latency, error rates and
+synthetic chat histories of any size, so the analytics path can be load-tested
+and profiled without network access.
+
+    python -m bench.stub_nala --port 11600 --users 50 --messages 400 --llm-ms 300 --llm-error-rate 0.02
+
+Implements POST /api/llm, GET /api/topiclist and GET /api/chathistory
+(chatbot_id, user_id, start_date, end_date, limit, offset). Histories are
+generated on demand from (seed, user, index), so any size costs no memory;
+user u has --messages rows alternating user/assistant, spread evenly over the
+last --days days. /api/llm answers the classification prompts backend.py sends
+(joint JSON batch, topic, Bloom level, aptitude) from the topic words and
+opening words of each message, so replies parse like a real model's.
+"""
+import argparse, json, random, threading, time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from bench.corpus import TOPICS
+
+TOPIC_NAMES = {"kolb": "Kolb's Experiential Learning", "bloom": "Bloom's Taxonomy",
+               "complex": "Complex Numbers", "matrix": "Matrices"}
+# question templates per Bloom level; their opening words let /api/llm recover the level
+BLOOM_TEMPLATES = {
+    "Remember": ["What is the definition of {a}?", "List the parts of {a}."],
+    "Understand": ["Can you explain {a} in simple terms?", "Why does {a} relate to {b}?"],
+    "Apply": ["How do I apply {a} to solve this {b} problem?", "Use {a} to compute the {b}."],
+    "Analyze": ["Compare {a} and {b}, what is the difference?", "Break down how {a} affects {b}."],
+    "Evaluate": ["Which is better, {a} or {b}? Justify it.", "Assess whether {a} is valid here."],
+    "Create": ["Design an exercise that combines {a} and {b}.", "Propose a new example of {a}."],
+}
+BLOOM_CUES = {"Remember": ["what is the definition", "list the"], "Understand": ["can you explain", "why does"],
+              "Apply": ["how do i apply", "use "], "Analyze": ["compare", "break down"],
+              "Evaluate": ["which is better", "assess"], "Create": ["design", "propose"]}
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+class StubConfig:
+    def __init__(self, users=20, messages=200, days=28, per_convo=10, llm_ms=300.0, history_ms=50.0,
+                 topics_ms=20.0, llm_error_rate=0.0, history_error_rate=0.0, topics_error_rate=0.0,
+                 paging=True, seed=13, now=None):
+        self.users = users
+        self.messages = messages            # per user; may be raised between runs to add newer messages
+        self.per_convo = per_convo
+        self.latency_s = {"llm": llm_ms / 1000.0, "chathistory": history_ms / 1000.0,
+                          "topiclist": topics_ms / 1000.0}
+        self.error_rate = {"llm": llm_error_rate, "chathistory": history_error_rate,
+                           "topiclist": topics_error_rate}
+        self.paging = paging
+        self.seed = seed
+        # message i of every user is at t0 + i * interval
+        end = (now or datetime.now()).replace(microsecond=0)
+        self.interval = timedelta(seconds=max(1, days * 86400 // max(1, messages)))
+        self.t0 = end - self.interval * messages
+        self.calls = {}                     # endpoint or llm prompt kind -> count
+        self.errors = {}
+        self.rows_served = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def count(self, key, errors=False):
+        with self.lock:
+            d = self.errors if errors else self.calls
+            d[key] = d.get(key, 0) + 1
+
+    def fail(self, endpoint) -> bool:
+        rate = self.error_rate[endpoint]
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors), "rows_served": self.rows_served}
+
+def message(cfg: StubConfig, user_id: int, i: int) -> dict:
+    """Row i of a user's history; the same (seed, user, i) always gives the same row."""
+    rng = random.Random(f"{cfg.seed}:{user_id}:{i // 2}")
+    topic = rng.choice(sorted(TOPICS))
+    a, b = rng.sample(TOPICS[topic], 2)
+    level = rng.choice(sorted(BLOOM_TEMPLATES))
+    question = rng.choice(BLOOM_TEMPLATES[level]).format(a=a, b=b)
+    if i % 2 == 0:
+        sender = "user"
+        # some clients store content parts as a JSON list
+        text = json.dumps([{"type": "text", "text": question}]) if i % 6 == 0 else question
+    else:
+        sender = "assistant"
+        text = f"Here is a worked explanation of {a} and {b} in the context of {TOPIC_NAMES[topic]}."
+    return {"msg_id": f"{user_id}-{i}", "convo_id": user_id * 100000 + i // cfg.per_convo,
+            "user_id": user_id, "msg_sender": sender, "msg_text": text,
+            "msg_timestamp": (cfg.t0 + cfg.interval * i).strftime(TS_FORMAT)}
+
+def _first_index(cfg: StubConfig, start_date) -> int:
+    # first message index at or after start_date (a YYYY-MM-DD date)
+    if not start_date:
+        return 0
+    start = datetime.strptime(start_date[:10], "%Y-%m-%d")
+    if start <= cfg.t0:
+        return 0
+    return min(cfg.messages, -(-int((start - cfg.t0).total_seconds()) // int(cfg.interval.total_seconds())))
+
+def history_page(cfg: StubConfig, user_id=None, start_date=None, end_date=None, limit=None, offset=0) -> list[dict]:
+    """Rows matching the filters, ordered by user then time, sliced by limit/offset."""
+    first = _first_index(cfg, start_date)
+    last = _first_index(cfg, end_date) if end_date else cfg.messages  # end_date exclusive
+    per_user = max(0, last - first)
+    users = [user_id] if user_id is not None else list(range(1, cfg.users + 1))
+    users = [u for u in users if 1 <= u <= cfg.users]
+    total = per_user * len(users)
+    if not cfg.paging or limit is None:
+        offset, limit = 0, total
+    rows = []
+    for n in range(offset, min(total, offset + limit)):
+        rows.append(message(cfg, users[n // per_user], first + n % per_user))
+    return rows
+
+def classify_text(text: str) -> tuple[str, str]:
+    """(topic name, Bloom level) from the cue words in a message, like a well-behaved model."""
+    low = text.lower()
+    topic = max(sorted(TOPICS), key=lambda t: sum(w in low for w in TOPICS[t]))
+    level = next((lv for lv, cues in BLOOM_CUES.items() if low.startswith(tuple(cues))), "Understand")
+    return TOPIC_NAMES[topic], level
+
+def llm_reply(system: str, text: str) -> tuple[str, str]:
+    """(prompt kind, reply text) for the prompts backend.py sends to /api/llm."""
+    system = system or ""
+    if "JSON array" in system:
+        items = []
+        for line in text.splitlines():
+            num, _, msg = line.partition(". ")
+            if num.strip().isdigit():
+                topic, level = classify_text(msg)
+                items.append({"id": int(num), "topic": topic, "bloom": level})
+        return "batch", json.dumps(items)
+    if "aptitude" in system:
+        counts = {}
+        for line in text.splitlines():
+            if "(Topic: " in line:
+                t = line.rsplit("(Topic: ", 1)[1].rstrip(")")
+                counts[t] = counts.get(t, 0) + 1
+        ranked = sorted(counts, key=lambda t: (-counts[t], t)) or ["Unknown"]
+        return "aptitude", f"Strongest: {ranked[0]}\nWeakest: {ranked[-1]}"
+    # the topic prompt lists "Bloom's Taxonomy" as a topic, so match on the role sentence
+    if "topic classifier" in system:
+        return "topic", classify_text(text)[0]
+    if "Bloom's taxonomy classifier" in system:
+        return "bloom", classify_text(text)[1]
+    return "other", "This is a stub reply."
+
+def make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass  # keep benchmark output clean
+
+        def _json(self, code, obj):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _begin(self, endpoint) -> bool:
+            # count, wait the configured latency, then maybe inject a 500
+            cfg.count(endpoint)
+            time.sleep(cfg.latency_s[endpoint])
+            if cfg.fail(endpoint):
+                cfg.count(endpoint, errors=True)
+                self._json(500, {"error": "injected failure"})
+                return False
+            return True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/api/topiclist":
+                if self._begin("topiclist"):
+                    self._json(200, {"chatbot_id": int(q.get("chatbot_id", 3)),
+                                     "topic_list": [TOPIC_NAMES[t] for t in sorted(TOPICS)]})
+                return
+            if url.path == "/api/chathistory":
+                if not self._begin("chathistory"):
+                    return
+                try:
+                    rows = history_page(cfg, int(q["user_id"]) if "user_id" in q else None,
+                                        q.get("start_date"), q.get("end_date"),
+                                        int(q["limit"]) if "limit" in q else None, int(q.get("offset", 0)))
+                except ValueError:
+                    return self._json(400, {"error": "invalid parameters"})
+                with cfg.lock:
+                    cfg.rows_served += len(rows)
+                return self._json(200, rows)
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                req = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._json(400, {"error": "invalid json"})
+            if self.path != "/api/llm":
+                return self._json(404, {"error": "not found"})
+            if not self._begin("llm"):
+                return
+            kind, text = llm_reply(req.get("system", ""), req.get("text", ""))
+            cfg.count(f"llm_{kind}")
+            self._json(200, {"text": text})
+    return Handler
+
+def start_stub(port=0, **kwargs):
+    """Start the stub in a daemon thread; returns (server, config). port=0 picks a free port."""
+    cfg = StubConfig(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-nala", daemon=True).start()
+    return server, cfg
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11600)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200, help="history rows per user (half are user messages)")
+    parser.add_argument("--days", type=int, default=28, help="history spans this many days up to now")
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--history-ms", type=float, default=50.0)
+    parser.add_argument("--topics-ms", type=float, default=20.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--history-error-rate", type=float, default=0.0)
+    parser.add_argument("--topics-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-paging", action="store_true", help="ignore limit/offset like older servers")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    server, _ = start_stub(args.port, users=args.users, messages=args.messages, days=args.days,
+                           llm_ms=args.llm_ms, history_ms=args.history_ms, topics_ms=args.topics_ms,
+                           llm_error_rate=args.llm_error_rate, history_error_rate=args.history_error_rate,
+                           topics_error_rate=args.topics_error_rate, paging=not args.no_paging, seed=args.seed)
+    print(f"Stub NALA listening on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
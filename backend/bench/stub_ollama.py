@@ -0,0 +1,107 @@
+# bench/stub_ollama.py
+"""
+Local stand-in for the Ollama chat API with configurable latency and token rate,
+so the RAG pipeline can be benchmarked without a model or network.
+
+    python -m bench.stub_ollama --port 11500 --ttft-ms 200 --tokens-per-s 40 --reply-tokens 120
+
+Implements POST /api/chat (stream false or true), POST /api/generate and GET /api/tags.
+Response time = ttft + reply_tokens / tokens_per_s.
+"""
+import argparse, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubConfig:
+    def __init__(self, ttft_ms=200.0, tokens_per_s=40.0, reply_tokens=120, model="stub"):
+        self.ttft_s = ttft_ms / 1000.0
+        self.tokens_per_s = tokens_per_s
+        self.reply_tokens = reply_tokens
+        self.model = model
+        self.requests = 0
+        self.lock = threading.Lock()
+
+def _reply_words(n: int) -> list[str]:
+    base = "Based on the provided context [1] the answer follows from the cited passage [2] .".split()
+    return [base[i % len(base)] for i in range(n)]
+
+def make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass  # keep benchmark output clean
+
+        def _json(self, code, obj):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/api/tags"):
+                return self._json(200, {"models": [{"name": cfg.model}]})
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                req = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._json(400, {"error": "invalid json"})
+            if self.path not in ("/api/chat", "/api/generate"):
+                return self._json(404, {"error": "not found"})
+            with cfg.lock:
+                cfg.requests += 1
+            words = _reply_words(cfg.reply_tokens)
+            per_token = 1.0 / cfg.tokens_per_s if cfg.tokens_per_s > 0 else 0.0
+            model = req.get("model", cfg.model)
+            time.sleep(cfg.ttft_s)
+            if req.get("stream", True) is False:
+                time.sleep(per_token * len(words))
+                text = " ".join(words)
+                if self.path == "/api/chat":
+                    return self._json(200, {"model": model, "message": {"role": "assistant", "content": text}, "done": True})
+                return self._json(200, {"model": model, "response": text, "done": True})
+            # newline-delimited JSON stream, one token per line
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, w in enumerate(words + [None]):
+                done = w is None
+                if self.path == "/api/chat":
+                    obj = {"model": model, "message": {"role": "assistant", "content": "" if done else w + " "}, "done": done}
+                else:
+                    obj = {"model": model, "response": "" if done else w + " ", "done": done}
+                line = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+                if not done:
+                    time.sleep(per_token)
+            self.wfile.write(b"0\r\n\r\n")
+    return Handler
+
+def start_stub(port=0, **kwargs):
+    """Start the stub in a daemon thread; returns (server, config). port=0 picks a free port."""
+    cfg = StubConfig(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server, cfg
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-s", type=float, default=40.0)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    args = parser.parse_args()
+    server, _ = start_stub(args.port, ttft_ms=args.ttft_ms, tokens_per_s=args.tokens_per_s,
+                           reply_tokens=args.reply_tokens)
+    print(f"Stub Ollama listening on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
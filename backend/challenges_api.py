@@ -53,7 +53,7 @@ def get_challenges():
         limit = int(request.args.get('limit', 100))
         offset = (page - 1) * limit
         
-        with safe_db_operation() as conn:
+        with safe_db_operation("fetch challenges", metric="get_challenges") as conn:
             cursor = conn.cursor()
             
             # Build query - get challenges with latest attempt info
@@ -202,7 +202,7 @@ def get_challenge(challenge_id: int):
     
     user_id = get_user_id_from_request()
     
-    with safe_db_operation() as conn:
+    with safe_db_operation("fetch challenge", metric="get_challenge") as conn:
         cursor = conn.cursor()
         
         # Get challenge
@@ -286,7 +286,7 @@ def submit_attempt(challenge_id: int):
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
     
-    with safe_db_operation() as conn:
+    with safe_db_operation("submit attempt", metric="submit_attempt") as conn:
         cursor = conn.cursor()
         
         # Verify challenge exists
@@ -336,7 +336,7 @@ def get_stats():
         
         user_id = get_user_id_from_request()
         
-        with safe_db_operation() as conn:
+        with safe_db_operation("fetch challenge stats", metric="get_stats") as conn:
             cursor = conn.cursor()
             
             # Get total solved and attempted
@@ -467,7 +467,7 @@ def get_current_challenge():
     user_id = get_user_id_from_request()
     today = datetime.now().strftime('%Y-%m-%d')
     
-    with safe_db_operation() as conn:
+    with safe_db_operation("fetch current challenge", metric="get_current_challenge") as conn:
         cursor = conn.cursor()
         
         # Get today's challenge
@@ -526,7 +526,7 @@ def get_user_profile(user_id: int):
     """
     ensure_database()
     
-    with safe_db_operation() as conn:
+    with safe_db_operation("fetch user profile", metric="get_user_profile") as conn:
         cursor = conn.cursor()
         
         # Get user profile
@@ -6,6 +6,9 @@
 from contextlib import contextmanager
 from typing import Optional, Dict, Any, List, Tuple
 import traceback
+import time
+
+from metrics import DB_OPERATION_SECONDS, DB_OPERATION_ERRORS
 
 # Database file path
 DB_PATH = os.path.join(os.path.dirname(__file__), 'challenges.db')
@@ -41,7 +44,7 @@ def get_db_connection():
 
 
 @contextmanager
-def safe_db_operation(operation_name: str = "database operation"):
+def safe_db_operation(operation_name: str = "database operation", metric: Optional[str] = None):
     """
     Context manager for safe database operations with automatic error handling.
     
@@ -53,17 +56,22 @@ def safe_db_operation(operation_name: str = "database operation"):
     
     Args:
         operation_name: Description of the operation for error messages
+        metric: Stable label for the db_operation_seconds histogram
+                (defaults to "other"; keep ids out of it)
     
     Raises:
         DatabaseError: If any database error occurs
     """
     conn = None
+    label = metric or "other"
+    start = time.perf_counter()
     try:
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row  # Enable column access by name
         yield conn
         conn.commit()
     except sqlite3.IntegrityError as e:
+        DB_OPERATION_ERRORS.inc(operation=label)
         if conn:
             conn.rollback()
         error_msg = f"Data integrity error during {operation_name}: {str(e)}"
@@ -71,6 +79,7 @@ def safe_db_operation(operation_name: str = "database operation"):
         traceback.print_exc()
         raise DatabaseError(error_msg) from e
     except sqlite3.OperationalError as e:
+        DB_OPERATION_ERRORS.inc(operation=label)
         if conn:
             conn.rollback()
         error_msg = f"Database operation failed during {operation_name}: {str(e)}"
@@ -78,6 +87,7 @@ def safe_db_operation(operation_name: str = "database operation"):
         traceback.print_exc()
         raise DatabaseError(error_msg) from e
     except Exception as e:
+        DB_OPERATION_ERRORS.inc(operation=label)
         if conn:
             conn.rollback()
         error_msg = f"Unexpected error during {operation_name}: {str(e)}"
@@ -87,6 +97,7 @@ def safe_db_operation(operation_name: str = "database operation"):
     finally:
         if conn:
             conn.close()
+        DB_OPERATION_SECONDS.observe(time.perf_counter() - start, operation=label)
 
 
 def init_database():
@@ -113,14 +124,15 @@ def ensure_database():
     if not os.path.exists(DB_PATH):
         init_database()
     else:
-        # Check if tables exist
+        # Check if tables exist (schema.sql is idempotent, so re-running it adds new tables)
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='challenges'
+                WHERE type='table' AND name IN ('challenges', 'message_classifications', 'user_analytics',
+                                                 'analytics_jobs')
             """)
-            if not cursor.fetchone():
+            if len(cursor.fetchall()) < 4:
                 init_database()
 
 
@@ -156,7 +168,7 @@ def get_user_by_id(user_id: int) -> Optional[dict]:
         DatabaseError: If database error occurs
     """
     try:
-        with safe_db_operation(f"get user {user_id}") as conn:
+        with safe_db_operation(f"get user {user_id}", metric="get_user") as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
             row = cursor.fetchone()
@@ -184,7 +196,7 @@ def get_challenge_by_id(challenge_id: int) -> Optional[dict]:
         DatabaseError: If database error occurs
     """
     try:
-        with safe_db_operation(f"get challenge {challenge_id}") as conn:
+        with safe_db_operation(f"get challenge {challenge_id}", metric="get_challenge_by_id") as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM challenges WHERE id = ?", (challenge_id,))
             row = cursor.fetchone()
@@ -219,7 +231,7 @@ def create_challenge_attempt(user_id: int, challenge_id: int,
         DatabaseError: If database error occurs
     """
     try:
-        with safe_db_operation("create challenge attempt") as conn:
+        with safe_db_operation("create challenge attempt", metric="create_challenge_attempt") as conn:
             cursor = conn.cursor()
             
             # Get the next attempt number for this user+challenge
@@ -259,7 +271,7 @@ def execute_query(query: str, params: Tuple = ()) -> list:
         DatabaseError: If database error occurs
     """
     try:
-        with safe_db_operation("execute query") as conn:
+        with safe_db_operation("execute query", metric="execute_query") as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             rows = cursor.fetchall()
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for serving backend.py in production (see wsgi.py)
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('FLASK_PORT', '5001')}"
+
+# Load models and the index in the master, then fork workers that share them
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, multiprocessing.cpu_count() // 2))))
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread"
+
+# /api/ask waits on the LLM for up to a minute
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    # Each worker gets its own slice of the cores for torch inference instead of
+    # every worker spawning one thread per core
+    try:
+        import torch
+        torch.set_num_threads(int(os.getenv("TORCH_THREADS", str(max(1, multiprocessing.cpu_count() // workers)))))
+    except ImportError:
+        pass
+    # Background analytics jobs run in every worker (threads don't survive the fork);
+    # jobs are claimed through the database, so each runs once
+    import backend
+    backend.analytics_jobs.start()
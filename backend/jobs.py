@@ -0,0 +1,259 @@
+"""
+In-process background job scheduler backed by the analytics_jobs SQLite table.
+
+Jobs are claimed atomically, so every gunicorn worker can run a scheduler
+against the same database. Per (kind, user_id, chatbot_id) there is at most one
+queued and one running job, and a queued job isn't claimed while another one
+for the same user is running. Running jobs hold a lease that their worker
+renews; a job whose lease lapses (its process died) is queued again.
+"""
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from database import safe_db_operation
+
+JOB_COLUMNS = ("id, kind, user_id, chatbot_id, full_refresh, status, error, created_at, started_at, "
+               "heartbeat_at, finished_at")
+
+
+def _job(row) -> Optional[Dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["full_refresh"] = bool(job["full_refresh"])
+    return job
+
+
+def _active_job(cursor, kind: str, user_id: int, chatbot_id: int, status: str) -> Optional[Dict]:
+    cursor.execute(f"""
+        SELECT {JOB_COLUMNS} FROM analytics_jobs
+        WHERE kind = ? AND user_id = ? AND chatbot_id = ? AND status = ?
+    """, (kind, user_id, chatbot_id, status))
+    return _job(cursor.fetchone())
+
+
+def enqueue_job(kind: str, user_id: int, chatbot_id: int, full_refresh: bool = False) -> Tuple[Dict, bool]:
+    """
+    Queue a job unless an equivalent one is already queued or running.
+
+    A queued job is reused, and upgraded to a full refresh if one is asked
+    for. A running job is reused unless it is incremental and a full refresh
+    is asked for; the full refresh is then queued behind it.
+
+    Returns:
+        Tuple of (job, created); created is False when an active job was reused
+    """
+    with safe_db_operation("enqueue analytics job", metric="jobs_enqueue") as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        queued = _active_job(cursor, kind, user_id, chatbot_id, "queued")
+        if queued is not None:
+            if full_refresh and not queued["full_refresh"]:
+                cursor.execute("UPDATE analytics_jobs SET full_refresh = 1 WHERE id = ?", (queued["id"],))
+                queued["full_refresh"] = True
+            return queued, False
+        running = _active_job(cursor, kind, user_id, chatbot_id, "running")
+        if running is not None and (running["full_refresh"] or not full_refresh):
+            return running, False
+        cursor.execute("""
+            INSERT INTO analytics_jobs (kind, user_id, chatbot_id, full_refresh)
+            VALUES (?, ?, ?, ?)
+        """, (kind, user_id, chatbot_id, int(full_refresh)))
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM analytics_jobs WHERE id = ?", (cursor.lastrowid,))
+        return _job(cursor.fetchone()), True
+
+
+def get_job(job_id: int) -> Optional[Dict]:
+    """Get a job by ID, or None"""
+    with safe_db_operation("fetch analytics job", metric="jobs_get") as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM analytics_jobs WHERE id = ?", (job_id,))
+        return _job(cursor.fetchone())
+
+
+def latest_job(kind: str, user_id: int, chatbot_id: int) -> Optional[Dict]:
+    """Most recent job of a kind for a user, or None"""
+    with safe_db_operation("fetch latest analytics job", metric="jobs_get") as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {JOB_COLUMNS} FROM analytics_jobs
+            WHERE kind = ? AND user_id = ? AND chatbot_id = ?
+            ORDER BY id DESC LIMIT 1
+        """, (kind, user_id, chatbot_id))
+        return _job(cursor.fetchone())
+
+
+def _expire_leases(cursor, lease_s: float) -> int:
+    # running jobs whose worker stopped renewing the lease go back to the queue,
+    # or fail if the user already has a queued job (which will redo the work);
+    # a job never renewed (heartbeat_at NULL) is timed from when it was claimed
+    cutoff = (datetime.utcnow() - timedelta(seconds=lease_s)).strftime("%Y-%m-%d %H:%M:%S")
+    cursor.execute("""
+        UPDATE analytics_jobs SET status = 'failed', error = 'lease expired', finished_at = datetime('now')
+        WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, created_at) < ? AND EXISTS (
+            SELECT 1 FROM analytics_jobs q
+            WHERE q.status = 'queued' AND q.kind = analytics_jobs.kind
+              AND q.user_id = analytics_jobs.user_id AND q.chatbot_id = analytics_jobs.chatbot_id)
+    """, (cutoff,))
+    cursor.execute("""
+        UPDATE analytics_jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL
+        WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, created_at) < ?
+    """, (cutoff,))
+    return cursor.rowcount
+
+
+def claim_job(lease_s: float = 300.0) -> Optional[Dict]:
+    """
+    Mark the oldest claimable queued job as running and return it (atomic
+    across processes). Expired leases are requeued first.
+    """
+    with safe_db_operation("claim analytics job", metric="jobs_claim") as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        requeued = _expire_leases(cursor, lease_s)
+        if requeued:
+            print(f"[JOBS] requeued {requeued} jobs with expired leases")
+        cursor.execute(f"""
+            SELECT {JOB_COLUMNS} FROM analytics_jobs
+            WHERE status = 'queued' AND NOT EXISTS (
+                SELECT 1 FROM analytics_jobs r
+                WHERE r.status = 'running' AND r.kind = analytics_jobs.kind
+                  AND r.user_id = analytics_jobs.user_id AND r.chatbot_id = analytics_jobs.chatbot_id)
+            ORDER BY id LIMIT 1
+        """)
+        job = _job(cursor.fetchone())
+        if job is None:
+            return None
+        cursor.execute("""
+            UPDATE analytics_jobs SET status = 'running', started_at = datetime('now'),
+                heartbeat_at = datetime('now')
+            WHERE id = ?
+        """, (job["id"],))
+        job["status"] = "running"
+        return job
+
+
+def renew_leases(job_ids: Iterable[int]) -> None:
+    """Refresh heartbeat_at of jobs this process is still running"""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+    with safe_db_operation("renew analytics job leases", metric="jobs_heartbeat") as conn:
+        conn.execute(
+            f"UPDATE analytics_jobs SET heartbeat_at = datetime('now') "
+            f"WHERE status = 'running' AND id IN ({','.join('?' * len(job_ids))})",
+            job_ids
+        )
+
+
+def finish_job(job_id: int, error: Optional[str] = None) -> None:
+    """Mark a running job done, or failed with an error message"""
+    with safe_db_operation("finish analytics job", metric="jobs_finish") as conn:
+        conn.execute("""
+            UPDATE analytics_jobs SET status = ?, error = ?, finished_at = datetime('now')
+            WHERE id = ? AND status = 'running'
+        """, ("failed" if error else "done", error, job_id))
+
+
+class JobScheduler:
+    """
+    Worker threads that run queued jobs through handlers[kind](user_id,
+    chatbot_id, full_refresh), plus an optional nightly callback. A heartbeat
+    thread renews the lease (lease_s) of the jobs this process is running.
+
+    Threads are started per process on first use (start() is safe to call
+    repeatedly and after a fork), so a gunicorn master that preloads the app
+    doesn't hand dead threads to its workers.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable], workers: int = 1, poll_s: float = 2.0,
+                 nightly: Optional[Callable] = None, nightly_hour: int = 2, lease_s: float = 300.0):
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_s = poll_s
+        self.nightly = nightly
+        self.nightly_hour = nightly_hour
+        self.lease_s = lease_s
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._running = set()
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._running = set()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"analytics-job-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="analytics-job-heartbeat", daemon=True).start()
+        if self.nightly is not None:
+            threading.Thread(target=self._nightly, name="analytics-nightly", daemon=True).start()
+
+    def enqueue(self, kind: str, user_id: int, chatbot_id: int, full_refresh: bool = False) -> Tuple[Dict, bool]:
+        self.start()
+        job, created = enqueue_job(kind, user_id, chatbot_id, full_refresh)
+        self._wake.set()
+        return job, created
+
+    def _work(self):
+        while True:
+            try:
+                job = claim_job(self.lease_s)
+            except Exception as e:
+                print(f"[JOBS] claim failed: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict):
+        start = time.time()
+        error = None
+        with self._lock:
+            self._running.add(job["id"])
+        try:
+            handler = self.handlers[job["kind"]]
+            handler(job["user_id"], job["chatbot_id"], job["full_refresh"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._running.discard(job["id"])
+        try:
+            finish_job(job["id"], error)
+        except Exception as e:
+            print(f"[JOBS] could not record job {job['id']} result: {e}")
+        print(f"[JOBS] {job['kind']} user={job['user_id']} {'failed: ' + error if error else 'done'} "
+              f"in {time.time() - start:.1f}s")
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease_s / 4)
+            with self._lock:
+                running = list(self._running)
+            try:
+                renew_leases(running)
+            except Exception as e:
+                print(f"[JOBS] could not renew job leases: {e}")
+
+    def _nightly(self):
+        while True:
+            now = datetime.now()
+            next_run = now.replace(hour=self.nightly_hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            time.sleep((next_run - now).total_seconds())
+            try:
+                self.nightly()
+            except Exception as e:
+                print(f"[JOBS] nightly refresh failed: {e}")
@@ -0,0 +1,90 @@
+# ragcore/admission.py
+import threading, time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+class Rejected(Exception):
+    """Request not admitted; reason is "queue_full", "user_limit" or "timeout"."""
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+class _Ticket:
+    __slots__ = ("event", "granted")
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+class AdmissionController:
+    """
+    At most max_concurrent requests run at once; the rest wait in per-user FIFO
+    queues that are served round-robin, so one user's burst can't starve the
+    others. New requests are rejected at once when max_queue are already
+    waiting or the user has max_per_user waiting, and a waiter gives up after
+    max_wait_s (or its own timeout, if shorter).
+    """
+    def __init__(self, max_concurrent=4, max_queue=32, max_wait_s=10.0, max_per_user=4):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.max_per_user = max_per_user
+        self.active = 0
+        self.queued = 0
+        self._queues = OrderedDict()  # user -> deque of tickets, in round-robin order
+        self._lock = threading.Lock()
+
+    def acquire(self, user, timeout=None) -> float:
+        """Block until admitted; returns the seconds spent queued."""
+        start = time.monotonic()
+        with self._lock:
+            if self.active < self.max_concurrent and not self.queued:
+                self.active += 1
+                return 0.0
+            if self.queued >= self.max_queue:
+                raise Rejected("queue_full", f"{self.queued} requests already queued")
+            q = self._queues.get(user)
+            if q is not None and len(q) >= self.max_per_user:
+                raise Rejected("user_limit", f"{len(q)} requests already queued for this user")
+            ticket = _Ticket()
+            if q is None:
+                q = self._queues[user] = deque()
+            q.append(ticket)
+            self.queued += 1
+        wait_s = self.max_wait_s if timeout is None else min(timeout, self.max_wait_s)
+        ticket.event.wait(wait_s)
+        with self._lock:
+            if ticket.granted:  # may have been granted just as the wait timed out
+                return time.monotonic() - start
+            q = self._queues[user]
+            q.remove(ticket)
+            if not q:
+                del self._queues[user]
+            self.queued -= 1
+        raise Rejected("timeout", f"not admitted within {wait_s:.1f}s")
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            while self.active < self.max_concurrent and self._queues:
+                user, q = next(iter(self._queues.items()))
+                ticket = q.popleft()
+                if q:
+                    self._queues.move_to_end(user)
+                else:
+                    del self._queues[user]
+                self.queued -= 1
+                self.active += 1
+                ticket.granted = True
+                ticket.event.set()
+
+    @contextmanager
+    def admit(self, user, timeout=None):
+        waited = self.acquire(user, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": self.active, "queued": self.queued, "users_waiting": len(self._queues)}
@@ -0,0 +1,186 @@
+# ragcore/backends.py
+import threading, time, requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failures; open rejects
+    calls for reset_s, then half_open lets one trial call through: success
+    closes the breaker, failure re-opens it.
+    """
+    def __init__(self, failure_threshold=5, reset_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_s:
+                self.state, self._trial = "half_open", False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.state, self.failures, self._trial = "closed", 0, False
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state, self.opened_at, self._trial = "open", time.monotonic(), False
+
+class LLMBackend:
+    """One upstream LLM endpoint with its own circuit breaker and latency window."""
+    def __init__(self, name, window=200, **breaker_kwargs):
+        self.name = name
+        self.breaker = CircuitBreaker(**breaker_kwargs)
+        self.latencies = deque(maxlen=window)  # seconds, successful calls only
+        self.requests = self.failures = 0
+        self._lock = threading.Lock()
+
+    def complete(self, system: str, text: str, timeout: float, **kwargs) -> dict:
+        raise NotImplementedError
+
+    def record(self, ok: bool, latency_s: float):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.latencies.append(latency_s)
+            else:
+                self.failures += 1
+        self.breaker.record(ok)
+
+    def percentile(self, q: float, min_samples=20):
+        with self._lock:
+            xs = sorted(self.latencies)
+        if len(xs) < min_samples:
+            return None
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+    def stats(self) -> dict:
+        return {"state": self.breaker.state, "requests": self.requests, "failures": self.failures,
+                "p50_s": self.percentile(0.5, 1), "p95_s": self.percentile(0.95, 1),
+                "p99_s": self.percentile(0.99, 1)}
+
+class OllamaBackend(LLMBackend):
+    def __init__(self, name, base_url, model, **kwargs):
+        super().__init__(name, **kwargs)
+        self.base_url, self.model = base_url, model
+
+    def complete(self, system, text, timeout, model=None, options=None, **_):
+        messages = ([{"role": "system", "content": system}] if system else []) + [{"role": "user", "content": text}]
+        payload = {"model": model or self.model, "messages": messages, "stream": False,
+                   "options": options or {"temperature": 0.7}}
+        r = requests.post(f"{self.base_url}/api/chat", json=payload, timeout=timeout)
+        r.raise_for_status()
+        return {"text": r.json().get("message", {}).get("content", "")}
+
+class NalaBackend(LLMBackend):
+    def __init__(self, name, base_url, api_key, **kwargs):
+        super().__init__(name, **kwargs)
+        self.base_url, self.api_key = base_url, api_key
+
+    def complete(self, system, text, timeout, **_):
+        payload = {"text": text}
+        if system:
+            payload["system"] = system
+        r = requests.post(f"{self.base_url}/api/llm", json=payload, timeout=timeout,
+                          headers={"X-API-Key": self.api_key})
+        if not r.ok:
+            try:
+                print("Error body:", r.json())
+            except Exception:
+                print("Error text:", r.text)
+            r.raise_for_status()
+        return r.json()
+
+class BackendPool:
+    """
+    Call backends in preference order, skipping those whose breaker is open.
+    If the primary hasn't answered by its hedge_quantile latency, a hedged
+    request goes to the next healthy backend and the first success wins; a
+    failed backend falls through to the next one while time remains. The
+    result carries the answering backend's name under "backend".
+    """
+    _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-backend")
+
+    def __init__(self, backends, hedge_quantile=0.95, hedge_min_samples=20):
+        self.backends = list(backends)
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedges = self.hedge_wins = self.fallbacks = 0
+
+    def _run(self, backend, system, text, timeout, kwargs):
+        start = time.monotonic()
+        try:
+            out = backend.complete(system, text, timeout, **kwargs)
+        except Exception:
+            backend.record(False, time.monotonic() - start)
+            raise
+        backend.record(True, time.monotonic() - start)
+        return out
+
+    def call(self, system: str, text: str, timeout: float = 60, **kwargs) -> dict:
+        deadline = time.monotonic() + timeout
+        queue = list(self.backends)
+        running, errors, hedged = {}, [], None
+
+        def launch():
+            # breaker.allow() is only asked when a backend is actually used, so a
+            # half-open breaker's single trial isn't spent on a backend left in the queue
+            while queue:
+                b = queue.pop(0)
+                if b.breaker.allow():
+                    left = max(0.001, deadline - time.monotonic())
+                    running[self._executor.submit(self._run, b, system, text, left, kwargs)] = b
+                    return b
+            return None
+
+        primary = launch()
+        if primary is None:
+            raise NoBackendAvailable(f"all LLM backends unavailable: {[b.name for b in self.backends]}")
+        hedge_after = primary.percentile(self.hedge_quantile, self.hedge_min_samples)
+        while running:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            wait_s = min(left, hedge_after) if hedge_after is not None and queue else left
+            done, _ = wait(list(running), timeout=wait_s, return_when=FIRST_COMPLETED)
+            if not done:
+                if queue and hedge_after is not None:
+                    hedge_after = None  # at most one hedge per call
+                    hedged = launch()
+                    if hedged is not None:
+                        self.hedges += 1
+                continue
+            for fut in done:
+                b = running.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    errors.append(f"{b.name}: {type(e).__name__}: {e}")
+                    if queue and not running and launch() is not None:
+                        self.fallbacks += 1
+                    continue
+                if b is hedged:
+                    self.hedge_wins += 1
+                return {**result, "backend": b.name}
+        if errors and not running:
+            raise NoBackendAvailable("; ".join(errors))
+        raise TimeoutError(f"no LLM backend answered within {timeout:.1f}s" + (f" ({'; '.join(errors)})" if errors else ""))
+
+    def stats(self) -> dict:
+        return {"hedges": self.hedges, "hedge_wins": self.hedge_wins, "fallbacks": self.fallbacks,
+                "backends": {b.name: b.stats() for b in self.backends}}
@@ -0,0 +1,91 @@
+# ragcore/batch.py
+import os, queue, threading, time
+from concurrent.futures import Future
+from ragcore.deadline import current_timeout
+
+class MicroBatcher:
+    """
+    Collect items submitted within max_wait_ms of each other (up to max_batch)
+    and run fn(items) once for the whole batch; fn must return one result per item.
+    Each caller gets its own result (or the batch's exception) back via a Future.
+    """
+    def __init__(self, fn, max_wait_ms=5.0, max_batch=16, name="batch", on_batch=None):
+        self.fn = fn
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.name = name
+        self.on_batch = on_batch          # optional callback(size, oldest_wait_s)
+        self.batches = self.items = 0
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._start()
+
+    def _start(self):
+        # threads don't survive fork (gunicorn preload): restart lazily in the child
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._q = queue.Queue()
+            self._thread = threading.Thread(target=self._loop, args=(self._q,), name=f"microbatch-{self.name}", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, item) -> Future:
+        if self._closed:
+            raise RuntimeError(f"MicroBatcher {self.name} is closed")
+        if self._pid != os.getpid():
+            self._start()
+        fut = Future()
+        self._q.put((item, fut, time.perf_counter()))
+        return fut
+
+    def __call__(self, item):
+        # the batch runs on the batcher thread; the caller waits no longer than its deadline
+        return self.submit(item).result(timeout=current_timeout())
+
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def close(self):
+        self._closed = True
+        self._q.put(None)
+
+    def _loop(self, q):
+        while True:
+            first = q.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    nxt = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._closed = True
+                    break
+                batch.append(nxt)
+            self._run(batch)
+            if self._closed and q.empty():
+                return
+
+    def _run(self, batch):
+        items = [b[0] for b in batch]
+        self.batches += 1
+        self.items += len(items)
+        if self.on_batch:
+            try:
+                self.on_batch(len(items), time.perf_counter() - batch[0][2])
+            except Exception:
+                pass
+        try:
+            results = self.fn(items)
+            for (_, fut, _), res in zip(batch, results):
+                fut.set_result(res)
+        except Exception as e:
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
@@ -0,0 +1,131 @@
+# ragcore/cache.py
+import os, json, time, hashlib, threading
+from pathlib import Path
+
+def request_key(*parts) -> str:
+    # content address: stable hash of the JSON-serialisable parts of a request
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """
+    Content-addressed JSON cache on disk: one file per key under root/<key[:2]>/<key>.json.
+    Entries expire after ttl_s; once the directory grows past max_bytes the least
+    recently used files (by mtime, refreshed on hit) are evicted down to 90%.
+    Safe across threads and processes sharing the directory (atomic replace on write).
+    """
+    def __init__(self, root, ttl_s=7 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        self.root = Path(root)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._bytes = None  # lazily measured on first write
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("LLM_CACHE", "1") == "0":
+            return None
+        root = os.getenv("LLM_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".llm_cache"))
+        ttl_s = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        max_bytes = int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+        return cls(root, ttl_s=ttl_s, max_bytes=max_bytes)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str):
+        p = self._path(key)
+        try:
+            entry = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl_s:
+            freed = self._remove(p)
+            with self._lock:
+                if self._bytes is not None:
+                    self._bytes = max(0, self._bytes - freed)
+            self.misses += 1
+            return None
+        try:
+            os.utime(p)  # LRU touch
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["value"]
+
+    def set(self, key: str, value):
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"created": time.time(), "value": value}, ensure_ascii=False).encode("utf-8")
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        try:
+            replaced = p.stat().st_size  # overwriting a key frees the old entry
+        except OSError:
+            replaced = 0
+        os.replace(tmp, p)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._measure()
+            else:
+                self._bytes = max(0, self._bytes + len(data) - replaced)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def get_or_call(self, key: str, fn):
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        value = fn()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def _files(self):
+        return [p for p in self.root.glob("*/*.json")]
+
+    def _measure(self) -> int:
+        total = 0
+        for p in self._files():
+            try:
+                total += p.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _remove(self, p: Path) -> int:
+        # bytes freed, 0 if another thread or process got there first
+        try:
+            size = p.stat().st_size
+            p.unlink()
+        except OSError:
+            return 0
+        return size
+
+    def _evict(self):
+        # caller holds self._lock
+        entries = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        now = time.time()
+        for mtime, size, p in entries:
+            if total <= self.max_bytes * 0.9 and now - mtime <= self.ttl_s:
+                break
+            self._remove(p)
+            total -= size
+            self.evictions += 1
+        self._bytes = total
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self._bytes or 0}
+
+# shared by ragcore.generate.call_llm and backend.llm
+llm_cache = DiskCache.from_env()
@@ -0,0 +1,132 @@
+# ragcore/chunkstore.py
+import os, sys, json, hashlib
+from collections.abc import Mapping
+import numpy as np
+
+class ChunkView(Mapping):
+    """
+    Read-only {"text", "meta"} view of one stored chunk, made only for returned
+    hits. Behaves like the chunk dicts from ingest_dir, so retrieval, reranking
+    and prompt building need no changes.
+    """
+    __slots__ = ("_store", "id")
+    _KEYS = ("text", "meta")
+
+    def __init__(self, store, i: int):
+        self._store = store
+        self.id = i
+
+    def __getitem__(self, key):
+        if key == "text":
+            return self._store.text(self.id)
+        if key == "meta":
+            return self._store.meta(self.id)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return f"ChunkView({self.id}, {self['text'][:40]!r})"
+
+class ChunkStore:
+    """
+    Chunks held as one UTF-8 text blob plus columnar arrays: offsets[i]:offsets[i+1]
+    is chunk i's text and meta_ids[i] indexes a table of distinct metadata dicts
+    (one per source file). save()/load(mmap=True) keep the blob and arrays
+    file-backed, so forked workers share them through the page cache.
+    """
+    def __init__(self, blob, offsets, meta_ids, metas):
+        self.blob = blob            # uint8 array (or memmap)
+        self.offsets = offsets      # int64, len n + 1
+        self.meta_ids = meta_ids    # int32, len n
+        self.metas = metas          # list of dicts
+
+    @classmethod
+    def from_chunks(cls, chunks: list[dict]):
+        parts, offsets, meta_ids, metas, meta_index = [], [0], [], [], {}
+        for c in chunks:
+            b = c["text"].encode("utf-8")
+            parts.append(b)
+            offsets.append(offsets[-1] + len(b))
+            key = json.dumps(c.get("meta", {}), sort_keys=True, default=str)
+            if key not in meta_index:
+                meta_index[key] = len(metas)
+                metas.append(dict(c.get("meta", {})))
+            meta_ids.append(meta_index[key])
+        blob = np.frombuffer(b"".join(parts), dtype=np.uint8)
+        return cls(blob, np.array(offsets, dtype=np.int64), np.array(meta_ids, dtype=np.int32), metas)
+
+    def __len__(self):
+        return len(self.meta_ids)
+
+    def __getitem__(self, i) -> ChunkView:
+        i = int(i)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return ChunkView(self, i)
+
+    def __iter__(self):
+        return (ChunkView(self, i) for i in range(len(self)))
+
+    def text(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def meta(self, i: int) -> dict:
+        return self.metas[self.meta_ids[i]]
+
+    def fingerprint(self) -> str:
+        # content hash of texts, boundaries and metadata; tells whether a saved index belongs to these chunks
+        h = hashlib.sha256(self.blob.tobytes())
+        h.update(np.ascontiguousarray(self.offsets, dtype=np.int64).tobytes())
+        h.update(json.dumps([self.metas, np.asarray(self.meta_ids).tolist()], sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def save(self, path: str):
+        # each file is written aside and renamed in, so readers mmapping the old store keep their inodes
+        os.makedirs(path, exist_ok=True)
+        def write(name, fn):
+            tmp = os.path.join(path, name + ".tmp")
+            with open(tmp, "wb") as f:
+                fn(f)
+            os.replace(tmp, os.path.join(path, name))
+        write("text.bin", lambda f: f.write(self.blob.tobytes()))
+        write("offsets.npy", lambda f: np.save(f, self.offsets))
+        write("meta_ids.npy", lambda f: np.save(f, self.meta_ids))
+        write("meta.json", lambda f: f.write(json.dumps(self.metas, ensure_ascii=False).encode("utf-8")))
+
+    @classmethod
+    def load(cls, path: str, mmap=False):
+        mode = "r" if mmap else None
+        blob_path = os.path.join(path, "text.bin")
+        if mmap and os.path.getsize(blob_path):
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.fromfile(blob_path, dtype=np.uint8)
+        offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode=mode)
+        meta_ids = np.load(os.path.join(path, "meta_ids.npy"), mmap_mode=mode)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            metas = json.load(f)
+        return cls(blob, offsets, meta_ids, metas)
+
+    def memory_report(self) -> dict:
+        n = len(self)
+        text_b = int(self.blob.nbytes)
+        index_b = int(self.offsets.nbytes + self.meta_ids.nbytes)
+        meta_b = sum(sys.getsizeof(m) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in m.items())
+                     for m in self.metas)
+        total = text_b + index_b + meta_b
+        return {"chunks": n, "text_bytes": text_b, "index_bytes": index_b, "meta_bytes": meta_b,
+                "total_bytes": total, "bytes_per_chunk": round(total / n, 1) if n else 0.0,
+                "mmap": isinstance(self.blob, np.memmap)}
+
+def dict_chunks_bytes(chunks: list[dict]) -> int:
+    # deep size of a list of ingest_dir chunk dicts, for comparison with memory_report()
+    total = sys.getsizeof(chunks)
+    for c in chunks:
+        total += sys.getsizeof(c) + sys.getsizeof(c["text"]) + sys.getsizeof(c["meta"])
+        total += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in c["meta"].items())
+    return total
@@ -0,0 +1,67 @@
+# ragcore/classify.py
+import numpy as np
+
+class CentroidClassifier:
+    """
+    Nearest-centroid text classifier over e5 embeddings (encoder: anything with
+    SentenceTransformer's encode, e.g. VectorIndex.model). Confidence is a softmax
+    over cosine similarity to each class centroid, sharpened by temperature, and
+    0 when even the nearest centroid is below min_similarity (off-topic text;
+    unrelated e5 pairs typically score ~0.7).
+    """
+    def __init__(self, encoder, temperature=0.02, min_examples=3, min_similarity=0.8):
+        self.encoder = encoder
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+        self.min_examples = min_examples
+        self.classes = []
+        self.centroids = None
+        self.n_examples = 0
+        self.missing = []
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        # classified messages are short questions, so they take e5's "query: " prefix
+        return np.asarray(self.encoder.encode([f"query: {t}" for t in texts], normalize_embeddings=True),
+                          dtype=np.float32)
+
+    def fit(self, texts: list[str], labels: list[str], classes=None):
+        # classes with fewer than min_examples are left out rather than guessed from one sample;
+        # with `classes`, every one of them must be covered, since a label the model hasn't
+        # seen would be confidently mapped to the nearest one it has
+        by_label = {}
+        for i, label in enumerate(labels):
+            by_label.setdefault(label, []).append(i)
+        self.missing = [c for c in classes if len(by_label.get(c, [])) < self.min_examples] if classes else []
+        if classes:
+            keep = {} if self.missing else {c: by_label[c] for c in classes}
+        else:
+            keep = {label: ix for label, ix in by_label.items() if len(ix) >= self.min_examples}
+        if len(keep) < 2:
+            self.classes, self.centroids, self.n_examples = [], None, 0
+            return self
+        rows = [i for ix in keep.values() for i in ix]
+        vecs = dict(zip(rows, self.embed([texts[i] for i in rows])))
+        self.classes = sorted(keep)
+        c = np.stack([np.mean([vecs[i] for i in keep[label]], axis=0) for label in self.classes])
+        self.centroids = c / (np.linalg.norm(c, axis=1, keepdims=True) + 1e-9)
+        self.n_examples = len(rows)
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def predict_embedded(self, vecs: np.ndarray) -> list[tuple[str, float]]:
+        sims = vecs @ self.centroids.T
+        z = (sims - sims.max(axis=1, keepdims=True)) / self.temperature
+        p = np.exp(z)
+        p /= p.sum(axis=1, keepdims=True)
+        best = p.argmax(axis=1)
+        return [(self.classes[b], float(p[r, b]) if sims[r, b] >= self.min_similarity else 0.0)
+                for r, b in enumerate(best)]
+
+    def predict(self, texts: list[str]) -> list[tuple[str, float]]:
+        # (label, confidence) per text; one encoder call for the whole batch
+        if not texts:
+            return []
+        return self.predict_embedded(self.embed(texts))
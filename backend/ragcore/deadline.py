@@ -0,0 +1,40 @@
+# ragcore/deadline.py
+import threading, time
+from contextlib import contextmanager
+
+_active = threading.local()
+
+class Deadline:
+    """Per-request time budget shared by every pipeline stage."""
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def timeout(self, cap: float) -> float:
+        # timeout for a blocking call: never more than cap, never past the deadline
+        return max(0.001, min(cap, self.remaining()))
+
+    @contextmanager
+    def active(self):
+        # make this the deadline seen by current_timeout() on this thread, for
+        # blocking calls below the pipeline (inference pool, micro-batch waits)
+        prev = getattr(_active, "deadline", None)
+        _active.deadline = self
+        try:
+            yield self
+        finally:
+            _active.deadline = prev
+
+def current_timeout(cap=None):
+    # timeout for a blocking call on this thread: the active deadline's remaining time
+    # (at most cap), or cap (None: no limit) when no deadline is active
+    deadline = getattr(_active, "deadline", None)
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap) if cap is not None else max(0.001, deadline.remaining())
@@ -4,8 +4,9 @@
 from sentence_transformers import SentenceTransformer
 
 class VectorIndex:
-    def __init__(self, model_name="intfloat/e5-base"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name="intfloat/e5-base", model=None):
+        # pass model to share an already-loaded encoder (e.g. when rebuilding for a hot reload)
+        self.model = model if model is not None else SentenceTransformer(model_name)
         self.index = None
         self.store = []   # parallel array of chunks
 
@@ -37,9 +38,28 @@ def search(self, query: str, top_k: int = 20):
     ]
         return results
     
+    def search_many(self, queries: list[str], top_k: int = 20) -> list[list[dict]]:
+        # one encoder call and one faiss search for a whole batch of queries
+        if self.index is None or len(self.store) == 0:
+            return [[] for _ in queries]
+        q = self._embed([f"query: {x}" for x in queries]).astype('float32')
+        sims, ids = self.index.search(q, top_k)
+        return [
+            [{"score": float(sims[r][i]), "chunk": self.store[idx]}
+             for i, idx in enumerate(ids[r]) if 0 <= idx < len(self.store)]
+            for r in range(len(queries))
+        ]
+
     def save_index(self, path):
         if self.index is not None:
             faiss.write_index(self.index, path)
 
-    def load_index(self, path):
-        self.index = faiss.read_index(path)
\ No newline at end of file
+    def load_index(self, path, mmap=False):
+        # mmap keeps the vectors file-backed, so forked workers share one copy via the page cache
+        if mmap:
+            try:
+                self.index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                return
+            except (RuntimeError, AttributeError):
+                pass  # index type / faiss build without mmap support
+        self.index = faiss.read_index(path)
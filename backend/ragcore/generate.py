@@ -1,5 +1,7 @@
 # ragcore/generate.py
-import os,json,requests
+import os,threading
+from ragcore.cache import llm_cache, request_key
+from ragcore.backends import OllamaBackend, NalaBackend, BackendPool
 
 SYSTEM = """You are a precise assistant. 
 - Use ONLY provided context to answer.
@@ -12,6 +14,58 @@
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b") 
 
+# Shared upstreams: each keeps one circuit breaker and latency window for both pools.
+# call_llm prefers local Ollama, backend.llm prefers NALA; LLM_FALLBACK=0 pins each to its own.
+ollama_backend = OllamaBackend("ollama", OLLAMA_BASE_URL, OLLAMA_MODEL)
+nala_backend = NalaBackend("nala", BASE_URL, API_KEY)
+_fallback = os.getenv("LLM_FALLBACK", "1") != "0"
+_hedge_q = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+generation_pool = BackendPool([ollama_backend] + ([nala_backend] if _fallback else []), hedge_quantile=_hedge_q)
+classification_pool = BackendPool([nala_backend] + ([ollama_backend] if _fallback else []), hedge_quantile=_hedge_q)
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one upstream call.
+
+    The first caller for a key runs fn; callers arriving while it is in flight
+    wait and receive the same result (or exception). Nothing is cached once the
+    call completes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0   # calls answered by another caller's request
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.coalesced += 1
+        if not leader:
+            if not call["done"].wait(timeout):
+                raise TimeoutError("timed out waiting for an identical in-flight request")
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+        return call["result"]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+_inflight = SingleFlight()
+
 def build_prompt(query: str, context_chunks: list[dict]):
     ctx = []
     for i, c in enumerate(context_chunks, 1):
@@ -21,9 +75,19 @@ def build_prompt(query: str, context_chunks: list[dict]):
     user = f"Question: {query}\n\nContext:\n{ctx_txt}\n\nAnswer with citations like [1], [2]."
     return SYSTEM, user
 
-def call_llm(query: str, context_chunks: list[dict], model=None):
+def passages_answer(context_chunks: list[dict]) -> str:
+    # generation-free fallback: the retrieved passages, numbered like citations
+    if not context_chunks:
+        return "No relevant passages were found in time."
+    parts = [f"[{i}] {c['chunk']['text']}" for i, c in enumerate(context_chunks, 1)]
+    return "An answer could not be generated in time. The most relevant passages are:\n\n" + "\n\n".join(parts)
+
+def call_llm(query: str, context_chunks: list[dict], model=None, timeout=60):
     """
-    Call Ollama API for LLM generation
+    Call Ollama API for LLM generation.
+    Concurrent calls with an identical prompt, model and options share one request,
+    and completed Ollama answers are kept in the on-disk llm_cache.
+    Raises TimeoutError / NoBackendAvailable when no backend answers in time.
     """
     system, user = build_prompt(query, context_chunks)
     
@@ -44,8 +108,19 @@ def call_llm(query: str, context_chunks: list[dict], model=None):
         }
     }
     
-    r = requests.post(url, json=payload, timeout=60)
-    r.raise_for_status()
-    
-    response_data = r.json()
-    return response_data.get("message", {}).get("content", "")
+    key = request_key(url, payload["model"], messages, payload["options"])
+    if llm_cache is not None:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    def fetch():
+        # Ollama first; NALA takes over (fallback or hedge) when Ollama is slow or failing
+        return generation_pool.call(system, user, timeout=timeout, model=payload["model"],
+                                    options=payload["options"])
+
+    result = _inflight.do(key, fetch, timeout=timeout)
+    # the key names the Ollama request, so a fallback or hedged NALA answer isn't stored under it
+    if llm_cache is not None and result.get("backend") == ollama_backend.name:
+        llm_cache.set(key, result["text"])
+    return result["text"]
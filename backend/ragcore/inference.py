@@ -0,0 +1,113 @@
+# ragcore/inference.py
+import os, threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from ragcore.deadline import current_timeout
+
+# ---- runs inside the inference worker processes ----
+_models = {}
+
+def _init_worker(embed_model, rerank_model, threads):
+    import torch
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+    torch.set_num_threads(threads)
+    if embed_model:
+        _models["embed"] = SentenceTransformer(embed_model)
+    if rerank_model:
+        _models["rerank"] = CrossEncoder(rerank_model)
+
+def _encode(texts, kwargs):
+    return _models["embed"].encode(texts, **kwargs)
+
+def _predict(pairs, kwargs):
+    return _models["rerank"].predict(pairs, **kwargs)
+
+# ---- request-side proxies ----
+class InferencePool:
+    """
+    Run embedding and cross-encoder inference in dedicated worker processes
+    (each loads both models once), so request threads only wait on results and
+    don't hold the GIL / CPU of the web process. Work is fed through the
+    executor's call queue; the pool size is independent of web concurrency.
+    The executor is (re)created lazily per process, so the pool survives a fork,
+    and after a worker crash (BrokenProcessPool). A call waits at most the
+    active request deadline, else timeout_s (None: no limit, e.g. index builds).
+    """
+    def __init__(self, embed_model, rerank_model, workers=2, threads_per_worker=1, timeout_s=None):
+        self.embed_model = embed_model
+        self.rerank_model = rerank_model
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.timeout_s = timeout_s
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.pending = 0   # calls submitted and not yet finished
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn: torch/tokenizer state must not be inherited through fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=mp.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.embed_model, self.rerank_model, self.threads_per_worker))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard(self, executor):
+        # a crashed worker breaks the executor for good; the next call starts a new one
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _call(self, fn, *args):
+        executor = self._get_executor()
+        try:
+            fut = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+        with self._lock:
+            self.pending += 1
+        try:
+            return fut.result(timeout=current_timeout(self.timeout_s))
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+        except FuturesTimeout:
+            fut.cancel()
+            raise TimeoutError(f"inference call exceeded its deadline ({fn.__name__})") from None
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def encoder(self):
+        return RemoteEncoder(self)
+
+    def cross_encoder(self):
+        return RemoteCrossEncoder(self)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+class RemoteEncoder:
+    # stands in for SentenceTransformer where VectorIndex calls model.encode(...)
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+
+    def encode(self, texts, **kwargs):
+        return self.pool._call(_encode, list(texts), kwargs)
+
+class RemoteCrossEncoder:
+    # stands in for CrossEncoder where Reranker calls model.predict(...)
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+
+    def predict(self, pairs, **kwargs):
+        return self.pool._call(_predict, list(pairs), kwargs)
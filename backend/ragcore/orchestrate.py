@@ -1,5 +1,7 @@
 # ragcore/orchestrate.py
+import math, re
 from rapidfuzz import fuzz
+from nltk.tokenize import sent_tokenize
 
 INTENTS = ["fact_lookup", "howto", "summarize", "compare", "reasoning"]
 
@@ -21,12 +23,83 @@ def rewrite_query(q: str, intent: str) -> str:
 
 def compress_context(chunks: list[dict], max_chars=4000) -> list[dict]:
     # simple extractive compression by removing very similar chunks
+    # max_chars=None only dedupes; pair with pack_context for a token budget
     kept, buf = [], 0
     for c in chunks:
         if not kept:
             kept.append(c); buf += len(c["chunk"]["text"])
             continue
         sim = max(fuzz.token_set_ratio(c["chunk"]["text"], k["chunk"]["text"]) for k in kept)
-        if sim < 85 and buf + len(c["chunk"]["text"]) <= max_chars:
+        if sim < 85 and (max_chars is None or buf + len(c["chunk"]["text"]) <= max_chars):
             kept.append(c); buf += len(c["chunk"]["text"])
     return kept
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_STOP = {"the", "and", "for", "are", "was", "what", "how", "why", "with", "that", "this", "from", "does", "into", "explain"}
+
+# the generator's tokenizer lives behind Ollama/NALA, so token counts are estimated:
+# words + punctuation, scaled up because BPE splits rare words, numbers and symbols further
+TOKEN_MARGIN = 1.25
+
+def estimate_tokens(text: str) -> int:
+    # approximate model tokens, erring high so a packed context stays inside CONTEXT_TOKENS
+    return math.ceil(len(_TOKEN_RE.findall(text)) * TOKEN_MARGIN)
+
+def _terms(text: str) -> set[str]:
+    return {w for w in re.findall(r"\w+", text.lower()) if len(w) > 2 and w not in _STOP}
+
+def _relevance(hits: list[dict]) -> list[float]:
+    # rerank logits / fused z-scores -> (0, 1], so they can be divided by cost
+    raw = [h.get("rerank", h.get("fused", h.get("score", 0.0))) for h in hits]
+    lo, hi = min(raw), max(raw)
+    if hi - lo < 1e-9:
+        return [1.0] * len(raw)
+    return [0.1 + 0.9 * (r - lo) / (hi - lo) for r in raw]
+
+def trim_to_budget(text: str, query: str, max_tokens: int) -> str:
+    """Keep the sentences of text that overlap the query most, within max_tokens, in original order."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sents = sent_tokenize(text)
+    q = _terms(query)
+    order = sorted(range(len(sents)), key=lambda i: (-len(q & _terms(sents[i])), i))
+    keep, used = [], 0
+    for i in order:
+        n = estimate_tokens(sents[i])
+        if used + n > max_tokens:
+            continue
+        keep.append(i); used += n
+    return " ".join(sents[i] for i in sorted(keep))
+
+def pack_context(query: str, hits: list[dict], max_tokens=1200, max_chunk_tokens=350, min_tokens=40) -> list[dict]:
+    """
+    Fill a context token budget (estimated, see estimate_tokens) by relevance per token.
+    Each hit is first trimmed to its most query-relevant sentences (max_chunk_tokens),
+    then hits are taken greedily by relevance/token; the last one may be trimmed
+    further to fit. Returns copies of the hits in their original (rank) order.
+    """
+    if not hits:
+        return []
+    rel = _relevance(hits)
+    cands = []
+    for i, h in enumerate(hits):
+        text = trim_to_budget(h["chunk"]["text"], query, max_chunk_tokens)
+        n = estimate_tokens(text)
+        if n:
+            cands.append((rel[i] / n, i, text, n))
+    picked, left = {}, max_tokens
+    for _, i, text, n in sorted(cands, key=lambda x: -x[0]):
+        if n > left:
+            if left < min_tokens:
+                continue
+            text = trim_to_budget(text, query, left)
+            n = estimate_tokens(text)
+            if not n or n > left:
+                continue
+        picked[i] = text; left -= n
+    out = []
+    for i in sorted(picked):
+        h = dict(hits[i])
+        h["chunk"] = {**hits[i]["chunk"], "text": picked[i]}
+        out.append(h)
+    return out
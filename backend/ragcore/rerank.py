@@ -1,12 +1,34 @@
 # ragcore/rerank.py
 from sentence_transformers import CrossEncoder
+from ragcore.batch import MicroBatcher
 
 class Reranker:
-    def __init__(self, model_name="BAAI/bge-reranker-base"):
-        self.model = CrossEncoder(model_name)
+    def __init__(self, model_name="BAAI/bge-reranker-base", model=None):
+        # pass model to use a shared or remote (ragcore.inference) cross-encoder
+        self.model = model if model is not None else CrossEncoder(model_name)
+        self.batcher = None
+
+    def enable_batching(self, max_wait_ms=5.0, max_batch=16, on_batch=None):
+        # concurrent rerank() calls are scored in one CrossEncoder.predict
+        self.batcher = MicroBatcher(self.rerank_many, max_wait_ms, max_batch, name="rerank", on_batch=on_batch)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
 
     def rerank(self, query: str, candidates: list[dict], top_k=8):
-        pairs = [(query, c["chunk"]["text"]) for c in candidates]
-        scores = self.model.predict(pairs).tolist()
-        for s, c in zip(scores, candidates): c["rerank"] = float(s)
-        return sorted(candidates, key=lambda x: -x["rerank"])[:top_k]
+        batcher = self.batcher
+        if batcher is not None:
+            return batcher((query, candidates, top_k))
+        return self.rerank_many([(query, candidates, top_k)])[0]
+
+    def rerank_many(self, requests: list[tuple]) -> list[list[dict]]:
+        pairs = [(q, c["chunk"]["text"]) for q, cands, _ in requests for c in cands]
+        scores = self.model.predict(pairs, batch_size=64).tolist() if pairs else []
+        out, pos = [], 0
+        for q, cands, top_k in requests:
+            for s, c in zip(scores[pos:pos + len(cands)], cands): c["rerank"] = float(s)
+            pos += len(cands)
+            out.append(sorted(cands, key=lambda x: -x["rerank"])[:top_k])
+        return out
@@ -2,24 +2,32 @@
 from rank_bm25 import BM25Okapi
 from datetime import datetime
 from ragcore.embed import VectorIndex
-from ragcore.ingest import ingest_dir
+from ragcore.batch import MicroBatcher
 import numpy as np
-# load and chunk your documents
-chunks = ingest_dir("data/raw")
-if not chunks:
-    raise ValueError("No data found in data/raw. Please add documents to index.")
-# build embeddings index
-vec = VectorIndex("intfloat/e5-base")
-vec.build(chunks)
 
 class HybridRetriever:
-    def __init__(self, chunks: list[dict], vec: VectorIndex):
+    def __init__(self, chunks, vec: VectorIndex):
+        # chunks: list of chunk dicts or a ChunkStore
         self.vec = vec
         self.chunks = chunks
-        self.corpus_tokens = [c["text"].split() for c in chunks]
-        if not self.corpus_tokens:
+        if not len(chunks):
             raise ValueError("No tokens found for BM25. Check your data and ingest logic.")
-        self.bm25 = BM25Okapi(self.corpus_tokens)
+        # BM25 keeps its own term counts; the token lists are not retained
+        self.bm25 = BM25Okapi(c["text"].split() for c in chunks)
+        self.batcher = None
+
+    def enable_batching(self, max_wait_ms=5.0, max_batch=16, on_batch=None):
+        # concurrent retrieve() calls share one query-encode + faiss search
+        def run(items):
+            k = max(k for _, k in items)
+            hits = self.vec.search_many([q for q, _ in items], k)
+            return [h[:k_i] for h, (_, k_i) in zip(hits, items)]
+        self.batcher = MicroBatcher(run, max_wait_ms, max_batch, name="encode", on_batch=on_batch)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
 
     def _metadata_filter(self, items, *, after=None, filename_contains=None):
         def ok(meta):
@@ -37,7 +45,16 @@ def ok(meta):
 
     def retrieve(self, query: str, k_vec=30, k_bm25=30, top_k=20, **filters):
         # semantic
-        vec_hits = self.vec.search(query, k_vec)
+        batcher = self.batcher
+        vec_hits = batcher((query, k_vec)) if batcher is not None else self.vec.search(query, k_vec)
+        return self._fuse(query, vec_hits, k_bm25, top_k, filters)
+
+    def retrieve_many(self, queries: list[str], k_vec=30, k_bm25=30, top_k=20, **filters) -> list[list[dict]]:
+        # offline batches: one encoder call + faiss search for all queries, then per-query fusion
+        vec_hits = self.vec.search_many(queries, k_vec)
+        return [self._fuse(q, h, k_bm25, top_k, filters) for q, h in zip(queries, vec_hits)]
+
+    def _fuse(self, query, vec_hits, k_bm25, top_k, filters):
         # lexical
         scores = self.bm25.get_scores(query.split())
         top_ids = np.argsort(scores)[::-1][:k_bm25]
@@ -44,3 +44,53 @@ CREATE INDEX IF NOT EXISTS idx_challenges_difficulty ON challenges(difficulty);
 CREATE INDEX IF NOT EXISTS idx_attempts_user_id ON challenge_attempts(user_id);
 CREATE INDEX IF NOT EXISTS idx_attempts_challenge_id ON challenge_attempts(challenge_id);
 CREATE INDEX IF NOT EXISTS idx_attempts_user_challenge ON challenge_attempts(user_id, challenge_id);
+
+-- Classified NALA chat messages (one row per message version)
+CREATE TABLE IF NOT EXISTS message_classifications (
+    msg_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    chatbot_id INTEGER NOT NULL,
+    convo_id INTEGER,
+    msg_timestamp TEXT,
+    msg_text TEXT,
+    topic TEXT NOT NULL,
+    bloom_level TEXT NOT NULL,
+    label_source TEXT NOT NULL DEFAULT 'llm',
+    created_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (msg_id, content_hash)
+);
+
+-- Per-user analytics: classification watermark (newest classified message
+-- timestamp) and the pre-aggregated /api/weekly_topics response (JSON)
+CREATE TABLE IF NOT EXISTS user_analytics (
+    user_id INTEGER NOT NULL,
+    chatbot_id INTEGER NOT NULL,
+    watermark TEXT,
+    summary TEXT,
+    updated_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (user_id, chatbot_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_classifications_user ON message_classifications(user_id, chatbot_id);
+
+-- Background analytics jobs (jobs.py); per (kind, user_id, chatbot_id) at most
+-- one queued and one running job. A running job's worker renews heartbeat_at;
+-- a job whose heartbeat lapses is queued again.
+CREATE TABLE IF NOT EXISTS analytics_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    chatbot_id INTEGER NOT NULL,
+    full_refresh INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'done', 'failed')),
+    error TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    started_at TEXT,
+    heartbeat_at TEXT,
+    finished_at TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_status ON analytics_jobs(kind, user_id, chatbot_id, status)
+    WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON analytics_jobs(status, id);
@@ -1,20 +1,203 @@
+"""
+Load generator for the backend HTTP API.
+
+Closed loop: --concurrency workers each send the next request as soon as the
+previous one returns. Open loop: requests are issued at a fixed --rate per
+second regardless of how fast the server answers, and latency is measured from
+each request's scheduled start (so queueing delay is not hidden).
+
+Examples:
+    python tester.py                                   # one /api/ask request
+    python tester.py --mode closed --concurrency 8 --duration 30
+    python tester.py --mode open --rate 20 --duration 60 --mix ask=1,challenges=4,stats=2
+    python tester.py --mode open --rate 5 --requests 200 --json load.json
+"""
+import argparse
+import itertools
+import random
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
-API_URL = "http://127.0.0.1:5000/api/ask"
+from bench.stats import summarize, run_info, write_json
+
+BASE_URL = "http://127.0.0.1:5001"
 TEST_QUERY = "Explain Kolb's 4 learning styles?"
+QUERIES = [
+    TEST_QUERY,
+    "What are the six levels of Bloom's taxonomy?",
+    "How does reflective observation differ from active experimentation?",
+    "Compare the Remember and Create levels of Bloom's taxonomy",
+    "What is the imaginary part of a complex number?",
+]
+
+# name -> (method, path, json body or None); user_id follows the challenges_api convention
+ENDPOINTS = {
+    "ask": lambda rng, uid: ("POST", "/api/ask", {"query": rng.choice(QUERIES), "user_id": uid}),
+    "challenges": lambda rng, uid: ("GET", f"/api/challenges?user_id={uid}", None),
+    "challenge": lambda rng, uid: ("GET", f"/api/challenges/{rng.randint(1, 100)}?user_id={uid}", None),
+    "current": lambda rng, uid: ("GET", f"/api/challenges/current?user_id={uid}", None),
+    "stats": lambda rng, uid: ("GET", f"/api/challenges/stats?user_id={uid}", None),
+    "attempt": lambda rng, uid: ("POST", f"/api/challenges/{rng.randint(1, 100)}/attempts",
+                                 {"user_id": uid, "answer": "load test", "score": 50,
+                                  "time_spent": "1 minute", "status": "completed"}),
+    "health": lambda rng, uid: ("GET", "/api/health", None),
+}
+
+
+def parse_mix(spec: str) -> dict:
+    """Parse 'ask=1,challenges=4' into endpoint weights."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}' in --mix (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, latency_s, status):
+        ok = isinstance(status, int) and status < 400
+        with self.lock:
+            self.latencies[name].append(latency_s)
+            self.statuses[name][str(status)] += 1
+            if not ok:
+                self.errors[name] += 1
+
+    def report(self, wall_s: float) -> dict:
+        out = {}
+        with self.lock:
+            names = sorted(self.latencies)
+            for name in names + ["all"]:
+                lat = (list(itertools.chain.from_iterable(self.latencies.values()))
+                       if name == "all" else self.latencies[name])
+                errors = sum(self.errors.values()) if name == "all" else self.errors[name]
+                row = summarize(lat)
+                row["throughput_rps"] = round(len(lat) / wall_s, 3) if wall_s > 0 else 0.0
+                row["errors"] = errors
+                row["error_rate"] = round(errors / len(lat), 4) if lat else 0.0
+                if name != "all":
+                    row["status_codes"] = dict(self.statuses[name])
+                out[name] = row
+        return out
+
+
+def send(session, base_url, name, rng, uid, timeout):
+    method, path, body = ENDPOINTS[name](rng, uid)
+    try:
+        r = session.request(method, base_url + path, json=body, timeout=timeout)
+        return r.status_code
+    except requests.RequestException as e:
+        return type(e).__name__
+
+
+def run_closed(args, mix, rec):
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    counter = itertools.count()
+
+    def worker(wid):
+        rng = random.Random(args.seed + wid)
+        session = requests.Session()
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if args.requests and next(counter) >= args.requests:
+                return
+            name = rng.choices(names, weights)[0]
+            uid = rng.randint(1, args.users)
+            t = time.perf_counter()
+            status = send(session, args.base_url, name, rng, uid, args.timeout)
+            rec.record(name, time.perf_counter() - t, status)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run_open(args, mix, rec):
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(args.seed)
+    interval = 1.0 / args.rate
+    local = threading.local()
+
+    def fire(name, uid, scheduled, seed):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        status = send(local.session, args.base_url, name, random.Random(seed), uid, args.timeout)
+        rec.record(name, time.perf_counter() - scheduled, status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in itertools.count():
+            scheduled = start + i * interval
+            if args.duration and scheduled - start >= args.duration:
+                break
+            if args.requests and i >= args.requests:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            pool.submit(fire, name, rng.randint(1, args.users), scheduled, rng.random())
+
+
+def print_report(report: dict, args, wall_s: float):
+    print(f"\n=== {args.mode}-loop load test against {args.base_url} ({wall_s:.1f}s) ===")
+    print(f"{'endpoint':<12}{'n':>7}{'rps':>9}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, r in report.items():
+        if not r.get("n"):
+            continue
+        print(f"{name:<12}{r['n']:>7}{r['throughput_rps']:>9.2f}{r['error_rate'] * 100:>8.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
 
 def main():
-    print(f"Sending test query: {TEST_QUERY}")
-    start = time.time()
-    response = requests.post(API_URL, json={"query": TEST_QUERY})
-    elapsed = time.time() - start
-    if response.ok:
-        data = response.json()
-        print(f"Response: {data}")
-    else:
-        print(f"Error: {response.status_code} {response.text}")
-    print(f"Elapsed time: {elapsed:.2f} seconds")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="closed: workers (default 1); open: max requests in flight (default 64)")
+    parser.add_argument("--rate", type=float, default=1.0, help="open loop: requests per second")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (0: use --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="total requests (0: use --duration)")
+    parser.add_argument("--mix", default="ask=1", help="endpoint weights, e.g. ask=1,challenges=4,stats=2")
+    parser.add_argument("--users", type=int, default=20, help="spread requests over user_id 1..N")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report as JSON to this path")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        args.requests = 1
+    if args.concurrency is None:
+        args.concurrency = 64 if args.mode == "open" else 1
+
+    mix = parse_mix(args.mix)
+    rec = Recorder()
+    start = time.perf_counter()
+    (run_open if args.mode == "open" else run_closed)(args, mix, rec)
+    wall_s = time.perf_counter() - start
+
+    report = rec.report(wall_s)
+    print_report(report, args, wall_s)
+    if args.json:
+        result = run_info(vars(args))
+        result["wall_s"] = round(wall_s, 3)
+        result["endpoints"] = report
+        write_json(args.json, result)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,17 @@
+"""
+Production WSGI entry point.
+
+Run from the backend directory:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app enabled (see gunicorn.conf.py) this module is imported once
+in the gunicorn master: models and the memory-mapped faiss index are loaded
+before the workers are forked, so every worker shares them copy-on-write.
+"""
+import os
+
+from backend import app, preload
+
+__all__ = ["app"]  # what gunicorn serves
+
+preload(os.getenv("RAG_DATA_DIR", "data/raw"))